@@ -1,15 +1,20 @@
-import dash
-from dash import dcc, html, dash_table
-from dash.dependencies import Input, Output
-import pandas as pd
-import plotly.express as px
+import startup  # first, so the startup profile covers the imports below
+from dash import dcc, html
+import logging
 
-# Load the data (replace with the correct CSV file path)
-full_df = pd.read_csv('CMP_DATA.csv', encoding='latin1')
-# Clean the data: Remove rows where any of the relevant columns are null
+from catalog_dashboard import HOST, dashboard_app, register_dashboard, slicer_options
+from catalog_engine import get_engine
+from chart_topk import cross_filter_controls
 
-# Initialize the Dash app
-app = dash.Dash(__name__, suppress_callback_exceptions=True)
+logging.basicConfig(level=logging.INFO)
+startup_profile = startup.StartupProfile('V7.sql')
+startup_profile.mark('imports')
+
+# Load the data through the shared catalog engine (CMP_DATA.csv as exported,
+# without the DB/schema cleansing or server name changes); filters and
+# counts run per partition across a worker pool
+engine = get_engine('cmp-raw')
+startup_profile.mark('indexes', breakdown=engine.load_timings)
 
 # Define a Grey-White theme
 theme = {
@@ -25,155 +30,95 @@ theme = {
     "table_cell_border": "#e0e0e0"
 }
 
-# Define the layout
-app.layout = html.Div(
-    style={"backgroundColor": theme["background"], "padding": "20px", "fontFamily": "Arial, sans-serif"},
-    children=[
-        html.H1(
-            "WSS SSRS CATALOG",
-            style={"textAlign": "center", "color": theme["text_color"], "marginBottom": "30px"}
-        ),
-
-        # Dropdown filters (slicers) - increased size of dropdowns
-        html.Div(
-            style={"display": "flex", "gap": "20px", "marginBottom": "20px", "flexWrap": "wrap"},
-            children=[
-                # Server dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id='server_selector',
-                        options=[{'label': i, 'value': i} for i in full_df['SERVER'].unique()],
-                        placeholder='Select Server',
-                        multi=False,
-                        style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
-                    )
-                ], style={"flex": "1"}),
-
-                # Database dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id='db_selector',
-                        options=[],
-                        placeholder='Select DB',
-                        multi=False,
-                        style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
-                    )
-                ], style={"flex": "1"}),
-
-                # Schema dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id='schema_selector',
-                        options=[],
-                        placeholder='Select Schema',
-                        multi=False,
-                        style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
-                    )
-                ], style={"flex": "1"}),
-
-                # Data Mart dropdown
-                html.Div([
-                    dcc.Dropdown(
-                        id='data_mart_selector',
-                        options=[],
-                        placeholder='Select Data Mart',
-                        multi=False,
-                        style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
-                    )
-                ], style={"flex": "1"}),
-            ]
-        ),
-
-        # Tabs for Report Table and Graphs
-        dcc.Tabs(id='tabs', children=[
-            dcc.Tab(label='Report Table', children=[
-                html.Div(id='report_table_tab', style={"padding": "20px"})
-            ]),
-            dcc.Tab(label='Statistical Graphs', children=[
-                html.Div(id='stats_graphs_tab', style={"padding": "20px"})
+# Statistical graphs: (column, title, axis labels)
+CHARTS = [('DATA MART', 'Count of Reports per Data Mart', None), ('DB', 'Count of Reports per Database', None),
+          ('SERVER', 'Count of Reports per Server', None), ('SCHEMA', 'Count of Reports per Schema', None)]
+
+# Define the layout (rebuilt per page load so the options follow catalog
+# refreshes); prefix keeps the ids unique when several dashboards are hosted
+# in one app (see catalog_pages.py)
+def layout(prefix=''):
+    return html.Div(
+        style={"backgroundColor": theme["background"], "padding": "20px", "fontFamily": "Arial, sans-serif"},
+        children=[
+            html.H1(
+                "WSS SSRS CATALOG",
+                style={"textAlign": "center", "color": theme["text_color"], "marginBottom": "30px"}
+            ),
+
+            # Dropdown filters (slicers) - increased size of dropdowns
+            html.Div(
+                style={"display": "flex", "gap": "20px", "marginBottom": "20px", "flexWrap": "wrap"},
+                children=[
+                    # Server dropdown
+                    html.Div([
+                        dcc.Dropdown(
+                            id=prefix + 'server_selector',
+                            options=slicer_options(engine, 'SERVER'),
+                            placeholder='Select Server',
+                            multi=False,
+                            style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
+                        )
+                    ], style={"flex": "1"}),
+
+                    # Database dropdown
+                    html.Div([
+                        dcc.Dropdown(
+                            id=prefix + 'db_selector',
+                            options=[],
+                            placeholder='Select DB',
+                            multi=False,
+                            style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
+                        )
+                    ], style={"flex": "1"}),
+
+                    # Schema dropdown
+                    html.Div([
+                        dcc.Dropdown(
+                            id=prefix + 'schema_selector',
+                            options=[],
+                            placeholder='Select Schema',
+                            multi=False,
+                            style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
+                        )
+                    ], style={"flex": "1"}),
+
+                    # Data Mart dropdown
+                    html.Div([
+                        dcc.Dropdown(
+                            id=prefix + 'data_mart_selector',
+                            options=[],
+                            placeholder='Select Data Mart',
+                            multi=False,
+                            style={"width": "220px", "fontSize": "16px", "backgroundColor": theme["dropdown_background"]}
+                        )
+                    ], style={"flex": "1"}),
+                ]
+            ),
+
+            # Filters picked by clicking chart bars
+            cross_filter_controls(prefix),
+
+            # Tabs for Report Table and Graphs
+            dcc.Tabs(id=prefix + 'tabs', children=[
+                dcc.Tab(label='Report Table', children=[
+                    html.Div(id=prefix + 'report_table_tab', style={"padding": "20px"})
+                ]),
+                dcc.Tab(label='Statistical Graphs', children=[
+                    html.Div(id=prefix + 'stats_graphs_tab', style={"padding": "20px"})
+                ])
             ])
-        ])
-    ]
-)
-
-# Callback for cascading dropdowns and dynamic options
-@app.callback(
-    [Output('db_selector', 'options'),
-     Output('schema_selector', 'options'),
-     Output('data_mart_selector', 'options'),
-     Output('report_table_tab', 'children'),
-     Output('stats_graphs_tab', 'children')],
-    [Input('server_selector', 'value'),
-     Input('db_selector', 'value'),
-     Input('schema_selector', 'value'),
-     Input('data_mart_selector', 'value')]
-)
-def update_slicers_and_table(server, db, schema, data_mart):
-    filtered_df = full_df.copy()
-
-    # Filter based on selections
-    if server:
-        filtered_df = filtered_df[filtered_df['SERVER'] == server]
-    if db:
-        filtered_df = filtered_df[filtered_df['DB'] == db]
-    if schema:
-        filtered_df = filtered_df[filtered_df['SCHEMA'] == schema]
-    if data_mart:
-        filtered_df = filtered_df[filtered_df['DATA MART'] == data_mart]
-
-    # Generate dynamic options for DB, Schema, Data Mart dropdowns
-    db_options = [{'label': i, 'value': i} for i in filtered_df['DB'].unique()]
-    schema_options = [{'label': i, 'value': i} for i in filtered_df['SCHEMA'].unique()]
-    data_mart_options = [{'label': i, 'value': i} for i in filtered_df['DATA MART'].unique()]
-
-    # Generate table for filtered data
-    table = dash_table.DataTable(
-        data=filtered_df.to_dict('records'),
-        columns=[{'name': col, 'id': col} for col in filtered_df.columns],
-        page_size=10,
-        style_table={'overflowX': 'auto'},
-        style_header={
-            "backgroundColor": theme["table_header_background"],
-            "color": theme["table_header_text"],
-            "fontWeight": "bold"
-        },
-        style_cell={
-            "backgroundColor": theme["table_cell_background"],
-            "color": theme["text_color"],
-            "border": f"1px solid {theme['table_cell_border']}",
-            "textAlign": "left"
-        }
+        ]
     )
 
-    # Generate statistical graphs
-    graphs = []
-    if not filtered_df.empty:
-        count_per_data_mart = filtered_df['DATA MART'].value_counts().reset_index()
-        count_per_data_mart.columns = ['DATA MART', 'Count']
-        fig_data_mart = px.bar(count_per_data_mart, x='DATA MART', y='Count', title='Count of Reports per Data Mart')
-
-        count_per_db = filtered_df['DB'].value_counts().reset_index()
-        count_per_db.columns = ['DB', 'Count']
-        fig_db = px.bar(count_per_db, x='DB', y='Count', title='Count of Reports per Database')
-
-        count_per_server = filtered_df['SERVER'].value_counts().reset_index()
-        count_per_server.columns = ['SERVER', 'Count']
-        fig_server = px.bar(count_per_server, x='SERVER', y='Count', title='Count of Reports per Server')
-
-        count_per_schema = filtered_df['SCHEMA'].value_counts().reset_index()
-        count_per_schema.columns = ['SCHEMA', 'Count']
-        fig_schema = px.bar(count_per_schema, x='SCHEMA', y='Count', title='Count of Reports per Schema')
-
-        graphs = [
-            dcc.Graph(figure=fig_data_mart),
-            dcc.Graph(figure=fig_db),
-            dcc.Graph(figure=fig_server),
-            dcc.Graph(figure=fig_schema)
-        ]
+def register_callbacks(app, prefix=''):
+    # Cascading dropdowns, table and cross-filtering statistical graphs
+    register_dashboard(app, engine, prefix, theme=theme, charts=CHARTS, cross_filter=True)
 
-    # Return dynamic options, the updated table, and graphs
-    return db_options, schema_options, data_mart_options, table, graphs
+# Standalone app (catalog_pages.py hosts the variants as pages of one app instead)
+def create_app():
+    return dashboard_app(__name__, layout, register_callbacks, startup_profile, store=engine.store)
 
 # Run the app
 if __name__ == '__main__':
-    app.run_server(host="0.0.0.0", port=8052, debug=False)
+    create_app().run_server(host=HOST, port=8052, debug=False)
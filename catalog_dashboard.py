@@ -0,0 +1,174 @@
+import os
+
+import dash
+from dash import callback_context, exceptions, html, no_update
+from dash.dependencies import Input, Output, State
+
+from catalog_engine import SELECTORS
+from catalog_export import register_export_callbacks, register_export_route
+from catalog_store import register_refresh_route
+from catalog_table import register_table_windows, report_table
+from chart_topk import (chart_filters, cross_filter_inputs, next_cross_filter, register_cross_filter,
+                        register_topk_drilldown, topk_graph)
+from option_index import SEARCH_DROPDOWNS, register_search_dropdowns
+
+# Interface the standalone apps listen on (only this machine by default;
+# set 0.0.0.0 to serve the network)
+HOST = os.environ.get('CATALOG_HOST', '127.0.0.1')
+
+
+def table_styles(theme=None):
+    # DataTable styling for a variant's theme (a plain scrolling table without one)
+    if theme is None:
+        return {'style_table': {'overflowX': 'auto'}, 'style_cell': {'textAlign': 'left'}}
+    return {
+        'style_table': {'overflowX': 'auto'},
+        'style_header': {
+            "backgroundColor": theme["table_header_background"],
+            "color": theme["table_header_text"],
+            "fontWeight": "bold"
+        },
+        'style_cell': {
+            "backgroundColor": theme["table_cell_background"],
+            "color": theme["text_color"],
+            "border": f"1px solid {theme['table_cell_border']}",
+            "textAlign": "left"
+        },
+    }
+
+
+def no_data(theme=None):
+    style = {"color": theme["text_color"]} if theme else None
+    return html.Div([html.H3("No data found for the selected filters.", style=style)])
+
+
+def slicer_options(engine, column, allowed=None):
+    # Options a slicer dropdown starts with: the top-N values in search mode
+    # (CATALOG_DROPDOWN_MODE), every value otherwise
+    if SEARCH_DROPDOWNS:
+        return engine.option_index.options(column, allowed=allowed)
+    return engine.options(column, allowed=allowed)
+
+
+def register_dashboard(app, engine, prefix='', theme=None, charts=(), charts_tab='stats_graphs_tab', cascade=True,
+                       cross_filter=False, headings=None, make_filters=None, allowed=None, exports=None,
+                       search=SEARCH_DROPDOWNS):
+    # The callbacks all dashboard variants share; a variant only supplies its
+    # layout (with the SELECTORS dropdowns and a report_table_tab) and theme.
+    #   charts: [(column, title, axis labels), ...] top-K bar charts for charts_tab
+    #   cascade: narrow the options of the later dropdowns by the selection
+    #   cross_filter: chart clicks filter the table and the other charts
+    #     (the layout needs chart_topk.cross_filter_controls)
+    #   headings: {'table': ..., 'charts': ...} titles above the table and charts
+    #   make_filters(filters): adjusts the dropdown filters (e.g. matching rules)
+    #   allowed: {column: values} the options of a dropdown are limited to
+    #   exports: ExportManager behind the layout's export_controls
+    #   search: dropdowns fetch top-N options through search_value (the
+    #     layout starts them with slicer_options)
+    selectors = [(prefix + dropdown_id, column) for dropdown_id, column in SELECTORS]
+    headings = headings or {}
+    allowed = allowed or {}
+    styles = table_styles(theme)
+    cross_id = prefix + 'cross_filter' if cross_filter else None
+
+    if search:
+        register_search_dropdowns(app, engine.option_index, selectors, make_filters, allowed, cascade)
+    cascaded = selectors[1:] if cascade and not search else []
+
+    outputs = ([Output(dropdown_id, 'options') for dropdown_id, _ in cascaded] +
+               [Output(prefix + 'report_table_tab', 'children')])
+    if charts:
+        outputs.append(Output(prefix + charts_tab, 'children'))
+    inputs = [Input(dropdown_id, 'value') for dropdown_id, _ in selectors]
+    state = []
+    if cross_filter:
+        # The chart filters are updated here too: a slicer change resets them
+        # and recomputes the page once, instead of once per store update
+        outputs.append(Output(cross_id, 'data'))
+        inputs += cross_filter_inputs(prefix)
+        state.append(State(cross_id, 'data'))
+    dropdown_ids = [dropdown_id for dropdown_id, _ in selectors]
+    reset_ids = dropdown_ids + [prefix + 'cross_filter_clear']
+
+    @app.callback(outputs, inputs, state)
+    def update_dashboard(*values):
+        filters = {column: value for (_, column), value in zip(selectors, values)}
+        if make_filters is not None:
+            filters = make_filters(filters)
+
+        triggered = [trigger for trigger in callback_context.triggered if trigger['prop_id'] != '.']
+        slicers_changed = not triggered or any(trigger['prop_id'].rsplit('.', 1)[0] in dropdown_ids
+                                               for trigger in triggered)
+        cross, cross_output = {}, []
+        if cross_filter:
+            cross = values[-1] or {}
+            picked = next_cross_filter(triggered, cross, reset_ids)
+            if picked is None and not slicers_changed:
+                raise exceptions.PreventUpdate
+            if picked is not None:
+                cross = picked
+            cross_output = [no_update if picked is None else picked]
+        # Chart picks narrow the table and the graphs further; the engine narrows
+        # the cached row set of the broader selection instead of rescanning
+        table_filters = {**filters, **cross}
+
+        if slicers_changed:
+            options = [engine.options(column, filters, allowed.get(column)) for _, column in cascaded]
+        else:
+            options = [no_update] * len(cascaded)
+        if not engine.row_count(table_filters):
+            return options + [no_data(theme)] + ([no_data(theme)] if charts else []) + cross_output
+
+        table = report_table(engine, table_filters, prefix + 'report_table', **styles)
+        if 'table' in headings:
+            table = html.Div([html.H3(headings['table']), table])
+        if not charts:
+            return options + [table]
+
+        # Only the top K values get a bar; the rest is rolled up into "Other"
+        # and each chart is filtered by the other charts' picks
+        graphs = []
+        for column, title, labels in charts:
+            chart_filter = chart_filters(filters, cross, column)
+            graphs.append(topk_graph(engine.counts(chart_filter)[column], column, title, labels=labels,
+                                     figure=engine.figure(chart_filter, column, title, labels), scope=prefix))
+        if 'charts' in headings:
+            graphs = html.Div([html.H3(headings['charts'])] + graphs)
+        return options + [table, graphs] + cross_output
+
+    # Serve the table's rows window by window in virtual mode (CATALOG_TABLE_MODE)
+    register_table_windows(app, engine, prefix + 'report_table', selectors, make_filters, cross_id)
+
+    if cross_filter:
+        # Show which values clicked chart bars filter on
+        register_cross_filter(app, scope=prefix)
+    if charts:
+        # Drill into the "Other" bar of a chart
+        register_topk_drilldown(app, lambda filters, col: engine.counts(filters)[col], selectors, scope=prefix,
+                                cross_filter=cross_id, make_filters=make_filters)
+    if exports is not None:
+        # Export the filtered catalog in the background
+        register_export_callbacks(app, exports, selectors, make_filters=make_filters, scope=prefix)
+
+
+def dashboard_app(name, layout, register_callbacks, profile=None, exports=None, store=None):
+    # Standalone app for one dashboard variant. Built on demand rather than at
+    # import, so hosting a variant as a page (catalog_pages.py) does not also
+    # create and wire an app nobody serves. The layout function runs on every
+    # page load.
+    app = dash.Dash(name, suppress_callback_exceptions=True)
+    if store is not None:
+        register_refresh_route(app.server, store)
+    if exports is not None:
+        register_export_route(app.server, exports)
+    app.layout = layout
+    if profile is not None:
+        # Built once here to time it (and warm the engine's option cache)
+        layout()
+        profile.mark('layout')
+
+    register_callbacks(app)
+    if profile is not None:
+        profile.mark('callbacks')
+        profile.report()
+    return app
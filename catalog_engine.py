@@ -0,0 +1,326 @@
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+
+from catalog_ingest import KEY_COLUMNS, VALID_DBS, VALID_SCHEMAS, add_upper_column, load_catalog
+from catalog_parallel import PartitionedCatalog, ranked
+from catalog_store import CatalogStore
+from chart_topk import TOP_K, top_k_figure
+from option_index import OptionIndex
+from shared_cache import TieredCache, open_shared_cache
+
+logger = logging.getLogger(__name__)
+
+# Background threads that prefetch table windows next to the one being viewed
+PREFETCH_WORKERS = int(os.environ.get('CATALOG_PREFETCH_WORKERS', 2))
+
+# Slicer dropdown ids (without page prefix) and the columns they filter
+SELECTORS = [('server_selector', 'SERVER'), ('db_selector', 'DB'),
+             ('schema_selector', 'SCHEMA'), ('data_mart_selector', 'DATA MART')]
+
+# Upper-cased server names (V10), derived from the SERVER categories of the
+# loaded export instead of a second, cleansed copy of it
+UPPER_SERVER = 'SERVER (upper)'
+
+# Columns identifying a report in both exports: a refresh reports a row
+# whose key stays but whose content differs as changed
+ROW_KEY = ['PATH', 'REPORT NAME']
+
+# Rows of the CMP_DATA export the cleansed dashboards keep (V8, V10)
+CLEANSED = {'DB': VALID_DBS, 'SCHEMA': VALID_SCHEMAS}
+
+
+def _load_full_inp(path):
+    # FullInp.csv: drop rows with missing slicer values; a missing export
+    # yields an empty catalog instead of failing the import
+    try:
+        return load_catalog(path, dropna_keys=True)
+    except FileNotFoundError:
+        logger.warning("%s not found, starting with an empty catalog", path)
+        return pd.DataFrame({col: pd.Categorical([]) for col in KEY_COLUMNS})
+
+
+def _load_cmp(path):
+    # CMP_DATA.csv as exported; the cleansing rules are applied per dataset
+    # (CLEANSED) on the one in-memory copy
+    return add_upper_column(load_catalog(path, encoding='latin1'), 'SERVER', UPPER_SERVER)
+
+
+# Catalog sources, each loaded into memory once per process: (source file,
+# loader, derived slicer columns the loader adds, row key)
+SOURCES = {
+    'full': ('FullInp.csv', _load_full_inp, [], ROW_KEY),
+    'cmp': ('CMP_DATA.csv', _load_cmp, [UPPER_SERVER], ROW_KEY),
+}
+
+# Dataset profiles the dashboards are built on: (source, rows kept as
+# {column: allowed values}, {column shown: source column it is read from})
+DATASETS = {
+    'full': ('full', None, None),
+    # valid DBs/schemas only, server names uppercased (V10)
+    'cmp': ('cmp', CLEANSED, {'SERVER': UPPER_SERVER}),
+    # valid DBs/schemas only, server names as exported (V8)
+    'cmp-raw-servers': ('cmp', CLEANSED, None),
+    # the export as is (V7)
+    'cmp-raw': ('cmp', None, None),
+}
+
+_sources = {}
+_engines = {}
+_engines_lock = threading.Lock()
+
+
+def get_engine(dataset):
+    # One engine per dataset profile per process, shared by every dashboard
+    # variant that uses it; the profiles of a source share one in-memory copy
+    with _engines_lock:
+        if dataset not in _engines:
+            source, where, columns = DATASETS[dataset]
+            if source not in _sources:
+                path, loader, derived, row_key = SOURCES[source]
+                _sources[source] = CatalogDataset(source, loader, path, derived, row_key)
+            _engines[dataset] = CatalogEngine(dataset, _sources[source], where, columns)
+        return _engines[dataset]
+
+
+def _active(filters):
+    # An empty list is kept: it is a filter no row matches
+    return {col: value for col, value in (filters or {}).items() if value is not None and value != ''}
+
+
+class CatalogDataset:
+    # Owns one loaded source with its partitions, indexes and caches, and
+    # answers the filter/aggregation queries of the datasets built on it.
+    # Filters here are on source columns; CatalogEngine maps a dataset's.
+
+    def __init__(self, name, loader, path, derived=(), row_key=None):
+        self.name = name
+        self.derived = list(derived)
+        columns = KEY_COLUMNS + self.derived
+        self.store = CatalogStore(loader, path, columns, row_key)
+        self.partitioned = PartitionedCatalog(self.store.df, columns, version=self.store.fingerprint,
+                                              order=self.store.order)
+        self.store.subscribe(self.partitioned.on_refresh)
+        # Versions are '<source>@<fingerprint>'; '@' never occurs in source
+        # names, so the namespace of one source is not a prefix of another's.
+        # The fingerprint is the one of the current partitions, not of the
+        # store: the store publishes a refreshed frame before its listeners
+        # have re-sharded it, and results computed in between must not be
+        # cached under the new version.
+        self.cache = TieredCache(lambda: f"{self.name}@{self.partitioned.version}", open_shared_cache(),
+                                 namespace=f"{self.name}@", positional=('row_ids',))
+        self.store.subscribe(self.cache.on_refresh)
+        self._prefetch = None
+        self._lock = threading.Lock()
+
+    @property
+    def df(self):
+        # The frame the partitions (and so all row ids) refer to
+        return self.partitioned.df
+
+    @property
+    def version(self):
+        return self.partitioned.version
+
+    @property
+    def order(self):
+        # Every row position, in the canonical row order (see CatalogStore)
+        return self.partitioned.order
+
+    def row_ids(self, filters=None, parent=None):
+        # Positions of the matching rows in the canonical row order, cached
+        # per filter so table windows and counts are derived from it instead
+        # of re-filtering. Positions depend on where this process's frame
+        # keeps each row, so they stay out of the shared tier; the records
+        # they list are the same in every worker.
+        # parent: filters whose (cached) rows are known to contain the result
+        filters = _active(filters)
+        return self.cache.get_or_compute('row_ids', filters, lambda: self._compute_row_ids(filters, parent),
+                                         shared=False)
+
+    def _compute_row_ids(self, filters, parent=None):
+        # A drill-down adds or changes one filter at a time, so the row set of
+        # the filters minus one column (or the parent's) is usually cached:
+        # narrow the smallest such set instead of scanning the whole catalog
+        candidates = [{other: value for other, value in filters.items() if other != col} for col in filters]
+        if parent:
+            candidates.append(parent)
+        best = None
+        for broader in candidates:
+            rows = self.cache.peek('row_ids', broader) if broader and broader != filters else None
+            if rows is not None and (best is None or len(rows) < len(best[1])):
+                best = (broader, rows)
+        if best is None:
+            return self.partitioned.row_ids(filters)
+        broader, rows = best
+        return self.partitioned.refine(rows, {col: value for col, value in filters.items()
+                                              if broader.get(col) != value})
+
+    def counts(self, filters=None, parent=None):
+        # {column: Series of report counts, largest first}; unfiltered counts
+        # come from the store's delta-maintained aggregates, filtered ones
+        # from the (incrementally narrowed) row set
+        filters = _active(filters)
+        if not filters:
+            return {col: ranked(pd.Series(dict(counts), dtype='int64'))
+                    for col, counts in self.store.counts.items()}
+        return self.cache.get_or_compute(
+            'counts', filters, lambda: self.partitioned.counts_for_rows(self.row_ids(filters, parent))
+        )
+
+    def prefetch(self, function, *args):
+        # Runs function(*args) on the background prefetch threads
+        with self._lock:
+            if self._prefetch is None:
+                self._prefetch = ThreadPoolExecutor(PREFETCH_WORKERS, thread_name_prefix='catalog-prefetch')
+        self._prefetch.submit(function, *args)
+
+
+class CatalogEngine:
+    # One dataset profile over a shared CatalogDataset: the rows it keeps
+    # (where, cached as a row set every query narrows) and the columns it
+    # shows (a derived source column in place of the loaded one). Answers
+    # the queries the dashboard callbacks need, in the dataset's columns.
+
+    def __init__(self, name, dataset, where=None, columns=None):
+        self.name = name
+        self.dataset = dataset
+        self.where = _active(where)
+        self.column_map = dict(columns or {})
+        # Slicer column -> source column
+        self.sources = {col: self.column_map.get(col, col) for col in KEY_COLUMNS if col in self.columns}
+        self._option_index = None
+        self._lock = threading.Lock()
+
+    @property
+    def store(self):
+        return self.dataset.store
+
+    @property
+    def columns(self):
+        # Columns shown: the source's, without the derived ones
+        return [col for col in self.dataset.df.columns if col not in self.dataset.derived]
+
+    @property
+    def version(self):
+        return self.dataset.version
+
+    @property
+    def load_timings(self):
+        return self.store.load_timings
+
+    @property
+    def option_index(self):
+        # Built on first use (search-mode dropdowns only)
+        with self._lock:
+            if self._option_index is None:
+                self._option_index = OptionIndex(self.counts)
+                self.store.subscribe(self._refresh_options)
+            return self._option_index
+
+    def _refresh_options(self, store, delta):
+        # CatalogStore listener: only the option lists whose filters the
+        # changed rows match are rebuilt
+        self._option_index.invalidate(lambda filters: delta.touches(self._scope(filters)))
+
+    def _scope(self, filters):
+        # The source filters of a dataset query: the where rows narrowed by
+        # the (mapped) filters; a value the where excludes matches nothing
+        scoped = dict(self.where)
+        for col, value in _active(filters).items():
+            col = self.column_map.get(col, col)
+            if col in self.where:
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                value = [item for item in values if item in self.where[col]]
+            scoped[col] = value
+        return scoped
+
+    def _row_ids(self, scoped):
+        if self.where and scoped != self.where:
+            # The where rows stay cached and are narrowed instead of rescanned
+            self.dataset.row_ids(self.where)
+            return self.dataset.row_ids(scoped, parent=self.where)
+        return self.dataset.row_ids(scoped)
+
+    def _counts(self, scoped):
+        counts = self.dataset.counts(scoped, parent=self.where)
+        return {col: counts[source] for col, source in self.sources.items()}
+
+    def take(self, rows):
+        # Source rows (positions from row_ids) as the dataset shows them
+        frame = self.dataset.df.iloc[rows]
+        if self.column_map:
+            frame = frame.assign(**{col: frame[source] for col, source in self.column_map.items()})
+        return frame[self.columns]
+
+    def filter(self, filters=None):
+        return self.take(self.row_ids(filters))
+
+    def records(self, filters=None):
+        # Listed in the canonical row order, so shared across workers (the
+        # shared tier skips entries above its size limit)
+        scoped = self._scope(filters)
+        return self.dataset.cache.get_or_compute(
+            'records', scoped, lambda: self.filter(filters).to_dict('records'), params={'dataset': self.name}
+        )
+
+    def row_ids(self, filters=None):
+        # Source row positions of the matching rows (see CatalogDataset.row_ids)
+        return self._row_ids(self._scope(filters))
+
+    def row_count(self, filters=None):
+        scoped = self._scope(filters)
+        if not scoped:
+            return len(self.dataset.order)
+        return len(self._row_ids(scoped))
+
+    def window(self, filters, offset, limit, prefetch=1):
+        # Records offset..offset+limit of the filtered rows; the next and
+        # previous `prefetch` windows are computed in the background
+        scoped = self._scope(filters)
+        records = self._window(scoped, offset, limit)
+        if prefetch:
+            total = self.row_count(filters)
+            for step in range(1, prefetch + 1):
+                for neighbour in (offset + step * limit, offset - step * limit):
+                    if 0 <= neighbour < total:
+                        self.dataset.prefetch(self._window, scoped, neighbour, limit)
+        return records
+
+    def _window(self, scoped, offset, limit):
+        def compute():
+            rows = self._row_ids(scoped) if scoped else self.dataset.order
+            return self.take(rows[offset:offset + limit]).to_dict('records')
+        return self.dataset.cache.get_or_compute('window', scoped, compute,
+                                                 params={'dataset': self.name, 'offset': offset, 'limit': limit})
+
+    def counts(self, filters=None):
+        # {column: Series of report counts, largest first} per slicer column
+        return self._counts(self._scope(filters))
+
+    def options(self, column, filters=None, allowed=None):
+        # Dropdown options for the values present under the filters
+        return [{'label': value, 'value': value} for value in self.counts(filters)[column].index
+                if allowed is None or value in allowed]
+
+    def figure(self, filters, column, title, labels=None):
+        # Top-K bar chart JSON for one column, shared across workers
+        scoped = self._scope(filters)
+        params = {'chart': column, 'source': self.sources[column], 'title': title, 'labels': labels, 'k': TOP_K}
+        return self.dataset.cache.get_or_compute(
+            'figure', scoped, lambda: top_k_figure(self._counts(scoped)[column], column, title,
+                                                   labels=labels).to_dict(),
+            params=params
+        )
+
+    def matching_values(self, column, value, ignore_case=False):
+        # Catalog values equal to value (case-insensitively if asked); falls
+        # back to [value] so a filter on an unknown value still matches nothing
+        if not ignore_case:
+            return [value]
+        matches = [candidate for candidate in self.store.counts[self.sources[column]]
+                   if str(candidate).lower() == str(value).lower()]
+        return matches or [value]
@@ -0,0 +1,357 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from dash import dcc, exceptions, html
+from dash.dependencies import Input, Output, State
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per deployment
+EXPORT_DIR = os.environ.get('CATALOG_EXPORT_DIR', os.path.join(tempfile.gettempdir(), 'catalog-exports'))
+EXPORT_TTL = float(os.environ.get('CATALOG_EXPORT_TTL', 3600))  # seconds a finished file is reused
+EXPORT_WORKERS = int(os.environ.get('CATALOG_EXPORT_WORKERS', 2))
+CHUNK_ROWS = int(os.environ.get('CATALOG_EXPORT_CHUNK_ROWS', 50_000))
+
+# Export formats: extension, mimetype, label
+FORMATS = {
+    'csv': ('.csv', 'text/csv', 'CSV'),
+    'parquet': ('.parquet', 'application/vnd.apache.parquet', 'Parquet'),
+    'xlsx': ('.xlsx', 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet', 'Excel'),
+}
+EXCEL_MAX_ROWS = 1_048_575  # sheet limit minus the header row
+
+# A queued/running status file not updated for this long belongs to a worker
+# that died; the export is started again
+STALE_SECONDS = 120
+
+_JOB_ID = re.compile(r'^[0-9a-f]{40}$')
+
+
+def _write_csv(path, chunks, progress):
+    with open(path, 'w', newline='', encoding='utf-8') as handle:
+        for number, chunk in enumerate(chunks):
+            chunk.to_csv(handle, header=number == 0, index=False)
+            progress(len(chunk))
+
+
+def _write_parquet(path, chunks, progress):
+    # pyarrow is only needed for Parquet exports
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    writer = None
+    try:
+        for chunk in chunks:
+            table = pa.Table.from_pandas(chunk, preserve_index=False,
+                                         schema=writer.schema if writer else None)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema)
+            writer.write_table(table)
+            progress(len(chunk))
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def _write_xlsx(path, chunks, progress):
+    # openpyxl is only needed for Excel exports; write-only mode streams rows
+    # to disk instead of building the sheet in memory
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet('Catalog')
+    for number, chunk in enumerate(chunks):
+        if number == 0:
+            sheet.append([str(col) for col in chunk.columns])
+        values = chunk.astype(object).where(chunk.notna(), None)
+        for row in values.itertuples(index=False, name=None):
+            sheet.append(row)
+        progress(len(chunk))
+    workbook.save(path)
+
+
+WRITERS = {'csv': _write_csv, 'parquet': _write_parquet, 'xlsx': _write_xlsx}
+
+
+class ExportJob:
+    def __init__(self, job_id, filters, fmt, path, total):
+        self.id = job_id
+        self.filters = filters
+        self.format = fmt
+        self.path = path
+        self.total = total
+        self.rows_written = 0
+        self.status = 'queued'  # queued, running, done, failed
+        self.error = None
+        self.finished = None
+
+    def to_dict(self):
+        return {'id': self.id, 'format': self.format, 'status': self.status, 'rows_written': self.rows_written,
+                'total': self.total, 'error': self.error}
+
+
+class ExportManager:
+    # Runs catalog exports on a background pool, writing each one in chunks
+    # to a temp file that is renamed into the artifact directory when done.
+    # Jobs are keyed by dataset fingerprint + filters + format: a repeated
+    # request joins the running job or reuses the finished file until it
+    # expires. Progress is published to a status file next to the artifact,
+    # so every worker using the directory can report on (and join) a job
+    # another worker is running.
+
+    def __init__(self, engine, directory=EXPORT_DIR, ttl=EXPORT_TTL, workers=EXPORT_WORKERS, chunk_rows=CHUNK_ROWS):
+        self.engine = engine
+        self.directory = directory
+        self.ttl = ttl
+        self.chunk_rows = chunk_rows
+        self.url = '/catalog/export'
+        self._jobs = {}
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(workers, thread_name_prefix='catalog-export')
+        os.makedirs(directory, exist_ok=True)
+
+    def _job_id(self, filters, fmt):
+        signature = json.dumps([self.engine.name, self.engine.version, filters, fmt],
+                               sort_keys=True, default=str)
+        return hashlib.sha1(signature.encode()).hexdigest()
+
+    def _fresh(self, path):
+        try:
+            return time.time() - os.path.getmtime(path) < self.ttl
+        except OSError:
+            return False
+
+    def _status_path(self, job_id):
+        return os.path.join(self.directory, f"catalog-{job_id}.json")
+
+    def _publish(self, job):
+        path = self._status_path(job.id)
+        temporary = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            with open(temporary, 'w') as handle:
+                json.dump(job.to_dict(), handle)
+            os.replace(temporary, path)
+        except OSError:
+            logger.warning("Could not write export status %s", path)
+
+    def _read_status(self, job_id):
+        # (status dict, seconds since last update) from the status file
+        path = self._status_path(job_id)
+        try:
+            with open(path) as handle:
+                return json.load(handle), time.time() - os.path.getmtime(path)
+        except (OSError, ValueError):
+            return None, None
+
+    def request(self, filters, fmt):
+        # Returns the id of the job for these filters and format, starting one
+        # unless it is running (in any worker) or finished and unexpired
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported export format: {fmt}")
+        filters = {col: value for col, value in (filters or {}).items() if value}
+        job_id = self._job_id(filters, fmt)
+        path = os.path.join(self.directory, f"catalog-{job_id}{FORMATS[fmt][0]}")
+        self.expire()
+
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None and (job.status in ('queued', 'running') or
+                                    (job.status == 'done' and self._fresh(path))):
+                return job_id
+            if self._fresh(path):
+                # Finished earlier, possibly by another worker process
+                return job_id
+            shared, age = self._read_status(job_id)
+            if shared and shared['status'] in ('queued', 'running') and age < STALE_SECONDS:
+                # Running in another worker process
+                return job_id
+
+            job = ExportJob(job_id, filters, fmt, path, self.engine.row_count(filters))
+            self._jobs[job_id] = job
+        self._publish(job)
+        self._pool.submit(self._run, job)
+        logger.info("Queued %s export %s (%d rows)", fmt, job_id, job.total)
+        return job_id
+
+    def _run(self, job):
+        job.status = 'running'
+        self._publish(job)
+        started = time.perf_counter()
+        temporary = f"{job.path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            if job.format == 'xlsx' and job.total > EXCEL_MAX_ROWS:
+                raise ValueError(f"{job.total} rows exceed the Excel sheet limit of {EXCEL_MAX_ROWS}")
+
+            def progress(rows):
+                job.rows_written += rows
+                self._publish(job)
+
+            WRITERS[job.format](temporary, self._chunks(job.filters), progress)
+            os.replace(temporary, job.path)
+            job.status = 'done'
+            logger.info("Exported %d rows to %s in %.1fs", job.rows_written, job.path,
+                        time.perf_counter() - started)
+        except Exception as error:
+            logger.exception("Export %s failed", job.id)
+            job.status, job.error = 'failed', str(error)
+            if os.path.exists(temporary):
+                os.remove(temporary)
+        finally:
+            job.finished = time.time()
+            self._publish(job)
+
+    def _chunks(self, filters):
+        # Rows of the engine's dataset (its kept rows and shown columns)
+        rows = self.engine.row_ids(filters)
+        for start in range(0, len(rows), self.chunk_rows):
+            yield self.engine.take(rows[start:start + self.chunk_rows])
+
+    def status(self, job_id):
+        # Status dict of a job started by any worker, or None if unknown
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        shared, age = self._read_status(job_id)
+        if shared is not None:
+            if shared['status'] in ('queued', 'running') and age >= STALE_SECONDS:
+                shared.update(status='failed', error="the worker running the export stopped")
+            return shared
+        artifact = self.artifact(job_id)
+        if artifact is not None:
+            return {'id': job_id, 'format': artifact[1], 'status': 'done', 'rows_written': None, 'total': None,
+                    'error': None}
+        return None
+
+    def artifact(self, job_id):
+        # (path, format) of a finished, unexpired export, or None
+        if not _JOB_ID.match(job_id or ''):
+            return None
+        for fmt, (extension, _, _) in FORMATS.items():
+            path = os.path.join(self.directory, f"catalog-{job_id}{extension}")
+            if self._fresh(path):
+                return path, fmt
+        return None
+
+    def expire(self):
+        # Remove expired artifacts and forget their jobs
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if name.startswith('catalog-') and now - os.path.getmtime(path) >= self.ttl:
+                    os.remove(path)
+            except OSError:
+                continue
+        with self._lock:
+            for job_id in [job_id for job_id, job in self._jobs.items()
+                           if job.finished and now - job.finished >= self.ttl]:
+                del self._jobs[job_id]
+
+
+_managers = {}
+_managers_lock = threading.Lock()
+
+
+def get_export_manager(engine):
+    # One export pool per catalog engine per process
+    with _managers_lock:
+        if engine.name not in _managers:
+            _managers[engine.name] = ExportManager(engine, directory=os.path.join(EXPORT_DIR, engine.name))
+        return _managers[engine.name]
+
+
+def register_export_route(server, manager, rule='/catalog/export'):
+    # GET <rule>/<job id> serves a finished export; send_file answers Range
+    # and conditional requests, so large downloads can resume
+    from flask import abort, send_file
+
+    def catalog_export(job_id):
+        artifact = manager.artifact(job_id)
+        if artifact is None:
+            abort(404)
+        path, fmt = artifact
+        extension, mimetype, _ = FORMATS[fmt]
+        return send_file(path, mimetype=mimetype, as_attachment=True, conditional=True,
+                         download_name=f"filtered_data{extension}")
+
+    manager.url = rule
+    endpoint = 'catalog_export' + rule.replace('/', '_')
+    server.add_url_rule(f"{rule}/<job_id>", endpoint, catalog_export, methods=['GET'])
+
+
+def export_controls(scope='', style=None):
+    # Format picker, export button, progress line and download link
+    # (see register_export_callbacks)
+    return html.Div([
+        dcc.RadioItems(
+            id=scope + 'export_format',
+            options=[{'label': label, 'value': fmt} for fmt, (_, _, label) in FORMATS.items()],
+            value='csv',
+            inline=True,
+            style={"marginBottom": "10px"}
+        ),
+        html.Button("Export", id=scope + 'export_button', n_clicks=0, style={"marginRight": "10px"}),
+        html.Span(id=scope + 'export_progress'),
+        dcc.Store(id=scope + 'export_job'),
+        dcc.Interval(id=scope + 'export_poll', interval=1000, disabled=True),
+        html.Div(
+            html.A("Download", id=scope + 'download-link', href="", target="_blank", style=style),
+            id=scope + 'export_download', style={"display": "none", "marginTop": "10px"}
+        ),
+    ], style={"textAlign": "center", "marginTop": "20px"})
+
+
+def register_export_callbacks(app, manager, selectors, make_filters=None, scope=''):
+    # selectors: [(dropdown_id, column), ...]; make_filters(filters) adjusts
+    # the {column: dropdown value} filters (default: used as they are)
+    @app.callback(
+        Output(scope + 'export_job', 'data'),
+        [Input(scope + 'export_button', 'n_clicks')],
+        [State(scope + 'export_format', 'value')] + [State(dropdown_id, 'value') for dropdown_id, _ in selectors]
+    )
+    def start_export(n_clicks, fmt, *values):
+        if not n_clicks:
+            raise exceptions.PreventUpdate
+        filters = {column: value for (_, column), value in zip(selectors, values)}
+        if make_filters is not None:
+            filters = make_filters(filters)
+        return manager.request(filters, fmt)
+
+    # Polls while the job runs; the interval switches itself off when done
+    @app.callback(
+        [Output(scope + 'export_progress', 'children'),
+         Output(scope + 'export_download', 'style'),
+         Output(scope + 'download-link', 'href'),
+         Output(scope + 'export_poll', 'disabled')],
+        [Input(scope + 'export_poll', 'n_intervals'),
+         Input(scope + 'export_job', 'data')]
+    )
+    def show_export_progress(n_intervals, job_id):
+        # Any worker can answer: progress comes from the shared status file
+        job = manager.status(job_id) if job_id else None
+        if job is None:
+            raise exceptions.PreventUpdate
+
+        hidden = {"display": "none", "marginTop": "10px"}
+        label = FORMATS[job['format']][2]
+        if job['status'] == 'failed':
+            return f"Export failed: {job['error']}", hidden, "", True
+        if job['status'] != 'done':
+            written, total = job['rows_written'], job['total']
+            percent = 100 * written / total if total else 0
+            return f"Exporting {label}: {written:,} of {total:,} rows ({percent:.0f}%)", hidden, "", False
+        if manager.artifact(job_id) is None:
+            return "Export expired, please export again.", hidden, "", True
+        shown = {"display": "block", "marginTop": "10px"}
+        rows = f" ({job['total']:,} rows)" if job['total'] is not None else ""
+        return f"{label} export ready{rows}", shown, f"{manager.url}/{job_id}", True
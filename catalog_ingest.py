@@ -0,0 +1,172 @@
+import logging
+import time
+
+import numpy as np
+import pandas as pd
+from pandas.api.types import union_categoricals
+
+logger = logging.getLogger(__name__)
+
+# Columns every dashboard variant slices on
+KEY_COLUMNS = ['SERVER', 'DB', 'SCHEMA', 'DATA MART']
+
+# Default cleansing rules for the CMP_DATA export (same lists the dashboards used)
+VALID_DBS = ["AAD", "WSS_DM", "me_wsl_01", "aw_wsl_01", "ARCH", "WSS_APTOS"]
+VALID_SCHEMAS = ["dbo", "mer"]
+
+# Rows parsed per chunk; keeps the raw object-dtype frame small while streaming
+DEFAULT_CHUNKSIZE = 100_000
+
+# Bytes read at a time when splitting an export into raw CSV records
+RECORD_BLOCK_BYTES = 16 * 1024 * 1024
+
+
+def cleanse_chunk(chunk, valid_dbs=None, valid_schemas=None, upper_servers=False, dropna_keys=False):
+    # Drop rows with missing slicer values
+    if dropna_keys:
+        chunk = chunk.dropna(subset=[col for col in KEY_COLUMNS if col in chunk.columns])
+
+    # Unify upper and lower case server names
+    if upper_servers:
+        chunk = chunk.assign(SERVER=chunk['SERVER'].str.upper())
+
+    # Retain only valid DBs and Schemas
+    if valid_dbs is not None:
+        chunk = chunk[chunk['DB'].isin(valid_dbs)]
+    if valid_schemas is not None:
+        chunk = chunk[chunk['SCHEMA'].isin(valid_schemas)]
+
+    return chunk
+
+
+def encode_chunk(chunk, category_columns):
+    # Dictionary-encode the low-cardinality slicer columns
+    return chunk.astype({col: 'category' for col in category_columns if col in chunk.columns})
+
+
+def iter_records(path, block_bytes=RECORD_BLOCK_BYTES):
+    # Raw CSV records of a file (header first) as lists of bytes, one list per
+    # block read. A record ends at a line break outside quotes, so a quoted
+    # field may span lines; blank lines are skipped, as read_csv does.
+    with open(path, 'rb') as handle:
+        tail = b''
+        while True:
+            block = handle.read(block_bytes)
+            if not block:
+                break
+            data = tail + block
+            buffer = np.frombuffer(data, dtype=np.uint8)
+            breaks = np.flatnonzero(buffer == ord('\n'))
+            quotes = np.flatnonzero(buffer == ord('"'))
+            ends = breaks[np.searchsorted(quotes, breaks) % 2 == 0].tolist()
+            if not ends:
+                tail = data
+                continue
+            starts = [0] + [end + 1 for end in ends[:-1]]
+            tail = data[ends[-1] + 1:]
+            yield [record for record in (data[start:end] for start, end in zip(starts, ends)) if record.strip()]
+        if tail.strip():
+            yield [tail]
+
+
+def combine_chunks(chunks, release=False):
+    # Concatenate encoded chunks, merging category dictionaries so the
+    # result stays categorical (pd.concat would fall back to object dtype).
+    # The categories of the first chunk keep their codes. The index is kept
+    # (load_catalog's record numbers). release=True drops each column from
+    # the chunks once merged; only for chunks the caller owns (not slices of
+    # another frame)
+    chunks = [chunk for chunk in chunks if len(chunk.columns)]
+    if not chunks:
+        return pd.DataFrame(columns=KEY_COLUMNS)
+
+    columns = list(chunks[0].columns)
+    index = np.concatenate([chunk.index.to_numpy() for chunk in chunks])
+    data = {}
+    for col in columns:
+        parts = [chunk[col] for chunk in chunks]
+        if all(isinstance(part.dtype, pd.CategoricalDtype) for part in parts):
+            data[col] = pd.Series(union_categoricals(parts, ignore_order=True), name=col)
+        else:
+            data[col] = pd.concat(parts, ignore_index=True)
+        if release:
+            # Release the per-chunk column copies as soon as they are merged
+            for chunk in chunks:
+                chunk.drop(columns=col, inplace=True)
+
+    return pd.DataFrame(data, columns=columns).set_axis(index)
+
+
+def add_upper_column(df, column, name):
+    # Upper-cased copy of a categorical column as another categorical column,
+    # derived from the categories: the row codes are remapped, so no string
+    # is built per row and the original column stays as loaded
+    values = df[column] if isinstance(df[column].dtype, pd.CategoricalDtype) else df[column].astype('category')
+    mapping, categories = pd.factorize(values.cat.categories.str.upper())
+    # A missing value (code -1) picks the appended -1
+    mapping = np.append(mapping, -1)
+    df[name] = pd.Categorical.from_codes(mapping[values.cat.codes.to_numpy()], categories=categories)
+    return df
+
+
+def load_catalog(path, encoding=None, usecols=None, dtype=None, category_columns=KEY_COLUMNS,
+                 valid_dbs=None, valid_schemas=None, upper_servers=False, dropna_keys=False,
+                 chunksize=DEFAULT_CHUNKSIZE):
+    # Stream the CSV in chunks so peak memory stays close to the compact
+    # (categorical) size of the final frame instead of the raw object frame.
+    # The index holds each row's record number in the file (0 = first row
+    # after the header) and df.attrs['rows_read'] the number of records, so
+    # CatalogStore can map raw records to rows. Seconds spent parsing,
+    # cleansing and encoding are left in df.attrs['timings'] for the startup
+    # profile.
+    started = time.perf_counter()
+    timings = {'csv load': 0.0, 'cleansing': 0.0, 'encoding': 0.0}
+    read_dtype = {col: 'object' for col in KEY_COLUMNS}
+    if dtype:
+        read_dtype.update(dtype)
+
+    chunks = []
+    rows_read = 0
+    rows_kept = 0
+    parsed = time.perf_counter()
+    reader = pd.read_csv(path, encoding=encoding, usecols=usecols, dtype=read_dtype, chunksize=chunksize)
+    with reader:
+        for number, chunk in enumerate(reader, start=1):
+            cleansed = time.perf_counter()
+            timings['csv load'] += cleansed - parsed
+            rows_read += len(chunk)
+            chunk = cleanse_chunk(chunk, valid_dbs, valid_schemas, upper_servers, dropna_keys)
+            encoded = time.perf_counter()
+            timings['cleansing'] += encoded - cleansed
+            chunk = encode_chunk(chunk, category_columns)
+            timings['encoding'] += time.perf_counter() - encoded
+            rows_kept += len(chunk)
+            chunks.append(chunk)
+            logger.info("Loaded chunk %d from %s: %d rows read, %d kept (%.1fs)",
+                        number, path, rows_read, rows_kept, time.perf_counter() - started)
+            parsed = time.perf_counter()
+        timings['csv load'] += time.perf_counter() - parsed
+
+    encoded = time.perf_counter()
+    full_df = combine_chunks(chunks, release=True)
+
+    # Remove servers with 0 count (empty categories would show up in value_counts)
+    for col in category_columns:
+        if col in full_df.columns and isinstance(full_df[col].dtype, pd.CategoricalDtype):
+            full_df[col] = full_df[col].cat.remove_unused_categories()
+    timings['encoding'] += time.perf_counter() - encoded
+    full_df.attrs['timings'] = timings
+    full_df.attrs['rows_read'] = rows_read
+
+    logger.info("Loaded %s: %d of %d rows kept, %.1f MB in memory (%.1fs: %s)",
+                path, len(full_df), rows_read, full_df.memory_usage(deep=True).sum() / 1e6,
+                time.perf_counter() - started,
+                ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items()))
+    return full_df
+
+
+def load_cmp_catalog(path='CMP_DATA.csv', upper_servers=True, **kwargs):
+    # The CMP_DATA export with the dashboards' standard cleansing rules
+    kwargs.setdefault('valid_dbs', VALID_DBS)
+    kwargs.setdefault('valid_schemas', VALID_SCHEMAS)
+    return load_catalog(path, encoding='latin1', upper_servers=upper_servers, **kwargs)
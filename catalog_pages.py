@@ -0,0 +1,78 @@
+import startup  # first, so the startup profile covers the imports below
+import importlib.util
+import logging
+import os
+import sys
+from importlib.machinery import SourceFileLoader
+
+import dash
+from dash import dcc, html
+
+from catalog_dashboard import HOST
+from catalog_export import register_export_route
+from catalog_store import register_refresh_route
+
+logging.basicConfig(level=logging.INFO)
+startup_profile = startup.StartupProfile('catalog_pages.py')
+startup_profile.mark('imports')
+
+# Variant sources live next to this file, wherever the app is started from
+# (the load-test harness runs it from a data directory)
+VARIANT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dashboard variants hosted as pages of one app: (page slug, source file).
+# Variants on the same source file share one in-memory copy of it, however
+# many pages and dataset profiles use it.
+VARIANTS = [
+    ('dash', 'DASH.py'),
+    ('dashv2', 'DASHV2.py'),
+    ('grey', 'GreyDSH.py'),
+    ('v4', 'V4.py'),
+    ('v7', 'V7.sql'),
+    ('v8', 'V8.py'),
+    ('v10', 'V10.sql'),
+]
+
+
+def load_variant(slug, filename):
+    # The V7/V10 variants keep a .sql extension, so load by explicit loader
+    name = f"catalog_page_{slug}"
+    loader = SourceFileLoader(name, os.path.join(VARIANT_DIR, filename))
+    module = importlib.util.module_from_spec(importlib.util.spec_from_loader(name, loader))
+    sys.modules[name] = module
+    loader.exec_module(module)
+    return module
+
+
+# Importing a variant only loads its engine and defines its layout and
+# callbacks; its standalone app is built by create_app() when run directly
+variants = [(slug, filename, load_variant(slug, filename)) for slug, filename in VARIANTS]
+startup_profile.mark('variants')
+
+app = dash.Dash(__name__, use_pages=True, pages_folder='', suppress_callback_exceptions=True)
+
+sources = {}
+for slug, filename, module in variants:
+    prefix = f"{slug}-"
+    dash.register_page(module.__name__, path=f"/{slug}", name=filename,
+                       layout=lambda module=module, prefix=prefix, **kwargs: module.layout(prefix))
+    module.register_callbacks(app, prefix)
+    sources[module.engine.dataset.name] = module.engine.store
+    if hasattr(module, 'exports'):
+        register_export_route(app.server, module.exports, rule=f"/catalog/{module.engine.name}/export")
+
+# One refresh endpoint per loaded source (POST /catalog/<source>/refresh)
+for name, store in sources.items():
+    register_refresh_route(app.server, store, rule=f"/catalog/{name}/refresh")
+
+app.layout = html.Div([
+    html.Div([dcc.Link(page['name'], href=page['relative_path'], style={"marginRight": "20px"})
+              for page in dash.page_registry.values()], style={"padding": "10px"}),
+    dash.page_container
+])
+startup_profile.mark('pages')
+startup_profile.report()
+
+# Run the app
+if __name__ == '__main__':
+    app.run_server(host=HOST, port=8050, debug=False)
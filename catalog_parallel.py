@@ -0,0 +1,345 @@
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import weakref
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from catalog_ingest import KEY_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+# Defaults, overridable per deployment
+PARTITIONS = int(os.environ.get('CATALOG_PARTITIONS', os.cpu_count() or 1))
+PARTITION_BY = os.environ.get('CATALOG_PARTITION_BY', 'rows')  # 'rows' or 'SERVER'
+EXECUTOR = os.environ.get('CATALOG_EXECUTOR', 'thread')  # 'thread' or 'process'
+
+# Row positions below which counting a row set is not split across threads
+COUNT_CHUNK_ROWS = int(os.environ.get('CATALOG_COUNT_CHUNK_ROWS', 100_000))
+
+# Memory-mapped partition arrays opened by this (worker) process, by path
+_mapped = {}
+
+
+def _scan(arrays, filter_codes):
+    # Positions of the rows of one partition matching the filter codes; numpy
+    # releases the GIL for the comparisons, so threads run in parallel
+    mask = None
+    for col, code in filter_codes:
+        match = np.isin(arrays[col], code) if isinstance(code, tuple) else arrays[col] == code
+        mask = match if mask is None else mask & match
+    return np.asarray(arrays['rows'] if mask is None else arrays['rows'][mask])
+
+
+def _count(codes, rows, columns, category_sizes):
+    # Per-column code counts of one chunk of row positions; the gather and
+    # bincount release the GIL, so chunks are counted in parallel on threads
+    counts = {}
+    for col in columns:
+        values = codes[col][rows]
+        counts[col] = np.bincount(values[values >= 0], minlength=category_sizes[col])
+    return counts
+
+
+def _scan_mapped(paths, filter_codes):
+    # Process-pool entry point: only file paths and filter codes are pickled,
+    # the partition itself is memory-mapped (and shared via the page cache)
+    arrays = {}
+    for name, path in paths.items():
+        if path not in _mapped:
+            # Files of rewritten partitions are deleted; forget their maps
+            for stale in [cached for cached in _mapped if not os.path.exists(cached)]:
+                del _mapped[stale]
+            _mapped[path] = np.load(path, mmap_mode='r')
+        arrays[name] = _mapped[path]
+    return _scan(arrays, filter_codes)
+
+
+def ranked(counts):
+    # Counts largest first, ties by value: the same ranking in every worker,
+    # whatever order the categories were added in
+    return counts.sort_index(kind='stable').sort_values(ascending=False, kind='stable')
+
+
+class PartitionedCatalog:
+    # Shards the slicer columns (as category codes) into partitions that are
+    # filtered and counted in parallel, then merges the per-partition results
+
+    def __init__(self, df, columns=KEY_COLUMNS, partitions=None, partition_by=None, executor=None, version=None,
+                 order=None):
+        self.columns = [col for col in columns if col in df.columns]
+        self.partition_count = max(1, partitions or PARTITIONS)
+        self.partition_by = partition_by or PARTITION_BY
+        self.executor_kind = executor or EXECUTOR
+        self._lock = threading.Lock()
+        self._pool = None
+        self._threads = None
+        self._directory = None
+        self._generation = 0
+        self.build(df, version, order)
+
+    def build(self, df, version=None, order=None):
+        # version identifies the dataset the partitions were built from; it is
+        # published together with them, so anything keyed on it (the engine's
+        # cache) never pairs a new version with old row positions. order: the
+        # row positions in the order row_ids lists them (default: as stored)
+        order = np.arange(len(df)) if order is None else np.asarray(order)
+        categories, codes = self._encode(df)
+
+        owner = missing_owner = None
+        if self.partition_by in self.columns:
+            partitions, owner, missing_owner = self._split_by_column(codes[self.partition_by],
+                                                                     len(categories[self.partition_by]))
+        else:
+            bounds = np.linspace(0, len(df), self.partition_count + 1, dtype=np.int64)
+            partitions = [np.arange(start, stop) for start, stop in zip(bounds[:-1], bounds[1:])]
+
+        shards = []
+        for rows in partitions:
+            shard = {col: codes[col][rows] for col in self.columns}
+            shard['rows'] = rows
+            shards.append(shard)
+
+        directory = None
+        paths = None
+        if self.executor_kind == 'process':
+            directory = tempfile.mkdtemp(prefix='catalog-partitions-')
+            paths = [self._save(directory, number, shard) for number, shard in enumerate(shards)]
+
+        with self._lock:
+            old_directory = self._directory
+            self._directory = directory
+            if directory:
+                weakref.finalize(self, shutil.rmtree, directory, True)
+            self._publish(df, version, order, None, categories, codes, shards, paths, owner, missing_owner)
+        if old_directory:
+            shutil.rmtree(old_directory, ignore_errors=True)
+        logger.info("Partitioned %d rows into %d %s-partitions", len(df), len(shards), self.partition_by)
+
+    def apply(self, df, first_added, version=None, order=None, live=None):
+        # Takes over a refresh that only tombstoned rows (live mask) and
+        # appended rows first_added.. to df, with the codes of the existing
+        # categories unchanged: the new rows' codes are appended to one
+        # partition (rows mode: the smallest; column mode: the one owning
+        # their value, new values going to the least loaded). Only the
+        # partitions that received rows are rewritten in process mode.
+        categories, codes = self._encode(df)
+        rows = np.arange(first_added, len(df))
+        with self._lock:
+            shards, paths = list(self.shards), list(self.paths) if self.paths is not None else None
+            owner, missing_owner = self.owner, self.missing_owner
+
+        loads = [len(shard['rows']) for shard in shards]
+        if owner is not None:
+            values = codes[self.partition_by][rows]
+            owner = np.concatenate([owner, np.full(len(categories[self.partition_by]) - len(owner), -1)])
+            new_values, new_counts = np.unique(values[values >= 0], return_counts=True)
+            for code, count in zip(new_values, new_counts):
+                if owner[code] < 0:
+                    owner[code] = loads.index(min(loads))
+                    loads[owner[code]] += int(count)
+            targets = np.where(values >= 0, owner[np.maximum(values, 0)], missing_owner)
+        else:
+            targets = np.full(len(rows), loads.index(min(loads)))
+
+        stale = []
+        for number in np.unique(targets).tolist():
+            part = rows[targets == number]
+            shard = {col: np.concatenate([shards[number][col], codes[col][part]]) for col in self.columns}
+            shard['rows'] = np.concatenate([shards[number]['rows'], part])
+            shards[number] = shard
+            if paths is not None:
+                stale.extend(paths[number].values())
+                paths[number] = self._save(self._directory, number, shard)
+
+        with self._lock:
+            self._publish(df, version, order, live, categories, codes, shards, paths, owner, missing_owner)
+        for path in stale:
+            # Workers that still map the file keep reading it until they reopen
+            os.remove(path)
+        logger.info("Appended %d rows to %d partitions (%d rows tombstoned)", len(rows), len(np.unique(targets)),
+                    0 if live is None else int(len(live) - live.sum()))
+
+    def _encode(self, df):
+        categories = {}
+        codes = {}
+        for col in self.columns:
+            values = df[col] if isinstance(df[col].dtype, pd.CategoricalDtype) else df[col].astype('category')
+            categories[col] = values.cat.categories
+            codes[col] = values.cat.codes.to_numpy()
+        return categories, codes
+
+    def _save(self, directory, number, shard):
+        # Shard arrays as .npy files for the process pool; every write gets
+        # new names, so a worker never maps a file that is being replaced
+        self._generation += 1
+        paths = {}
+        for name, array in shard.items():
+            paths[name] = os.path.join(directory, f"p{number}_g{self._generation}_{name.replace(' ', '_')}.npy")
+            np.save(paths[name], array)
+        return paths
+
+    def _publish(self, df, version, order, live, categories, codes, shards, paths, owner, missing_owner):
+        # Called with the lock held: everything a query reads, switched at once
+        rank = np.empty(len(df), dtype=np.int64)
+        rank[order] = np.arange(len(order))
+        self.df = df
+        self.version = version
+        self.order = order
+        self.rank = rank
+        self.live = live
+        self.categories = categories
+        self.codes = codes
+        self.category_sizes = {col: len(categories[col]) for col in self.columns}
+        self.shards = shards
+        self.paths = paths
+        self.owner = owner
+        self.missing_owner = missing_owner
+
+    def _split_by_column(self, codes, size):
+        # Greedy bin packing of whole column values (largest first) so every
+        # value lives in exactly one partition and partitions stay balanced;
+        # returns the partitions' rows, the partition of every value and the
+        # one of rows with a missing value
+        sizes = np.bincount(codes[codes >= 0], minlength=size)
+        loads = [0] * self.partition_count
+        assignment = np.zeros(size + 1, dtype=np.int64)
+        for code in np.argsort(-sizes, kind='stable'):
+            target = loads.index(min(loads))
+            assignment[code] = target
+            loads[target] += int(sizes[code])
+        # Rows with a missing value go to the least loaded partition
+        assignment[size] = loads.index(min(loads))
+        owner = assignment[np.where(codes >= 0, codes, size)]
+        order = np.argsort(owner, kind='stable')
+        splits = np.searchsorted(owner[order], np.arange(1, self.partition_count))
+        return np.split(order, splits), assignment[:size], int(assignment[size])
+
+    @property
+    def pool(self):
+        with self._lock:
+            if self._pool is None:
+                workers = self.partition_count
+                self._pool = ProcessPoolExecutor(workers) if self.executor_kind == 'process' else ThreadPoolExecutor(workers)
+            return self._pool
+
+    @property
+    def threads(self):
+        # Thread pool for work on the in-memory code arrays (the process pool
+        # only sees the memory-mapped partitions)
+        if self.executor_kind != 'process':
+            return self.pool
+        with self._lock:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(self.partition_count)
+            return self._threads
+
+    @staticmethod
+    def _filter_codes(categories, filters):
+        # Translate filter values to codes; a list of values matches any of
+        # them and an unknown value matches nothing (returns None)
+        filter_codes = []
+        for col, value in (filters or {}).items():
+            if value is None or value == '':
+                continue
+            many = isinstance(value, (list, tuple, set))
+            codes = categories[col].get_indexer(list(value) if many else [value])
+            codes = tuple(int(code) for code in codes if code >= 0)
+            if not codes:
+                return None
+            filter_codes.append((col, codes if many else codes[0]))
+        return filter_codes
+
+    @staticmethod
+    def _series(counts, categories, col):
+        return ranked(pd.Series(counts, index=categories[col], name='count')[lambda c: c > 0])
+
+    def _run(self, filters):
+        # Positions of the live rows matching filters, in the catalog's row order
+        with self._lock:
+            categories, shards, paths = self.categories, self.shards, self.paths
+            owner, order, rank, live = self.owner, self.order, self.rank, self.live
+
+        filter_codes = self._filter_codes(categories, filters)
+        if filter_codes is None:
+            return np.array([], dtype=np.int64)
+
+        # Partitions that cannot hold the filtered value are skipped
+        selected = range(len(shards))
+        if owner is not None:
+            wanted = dict(filter_codes).get(self.partition_by)
+            if wanted is not None:
+                wanted = list(wanted) if isinstance(wanted, tuple) else [wanted]
+                selected = sorted({number for number in owner[wanted].tolist() if number >= 0})
+
+        if paths is not None:
+            futures = [self.pool.submit(_scan_mapped, paths[number], filter_codes) for number in selected]
+        else:
+            futures = [self.pool.submit(_scan, shards[number], filter_codes) for number in selected]
+        results = [future.result() for future in futures]
+
+        rows = np.concatenate(results) if results else np.array([], dtype=np.int64)
+        if live is not None:
+            rows = rows[live[rows]]
+        return order[np.sort(rank[rows])]
+
+    def row_ids(self, filters=None):
+        # Positions of the matching rows, listed in the catalog's row order
+        if all(value is None or value == '' for value in (filters or {}).values()):
+            with self._lock:
+                return self.order
+        return self._run(filters)
+
+    def refine(self, rows, filters):
+        # The subset of rows (positions from an earlier row_ids, order kept)
+        # that also matches filters; costs O(len(rows)) instead of a full scan
+        with self._lock:
+            categories, codes = self.categories, self.codes
+        filter_codes = self._filter_codes(categories, filters)
+        if filter_codes is None:
+            return np.array([], dtype=np.int64)
+        for col, code in filter_codes:
+            values = codes[col][rows]
+            rows = rows[np.isin(values, code) if isinstance(code, tuple) else values == code]
+        return rows
+
+    def counts_for_rows(self, rows, columns=None):
+        # {column: Series of report counts > 0, largest first} for the given
+        # row positions; large row sets are split into one chunk per
+        # partition and counted on the pool, then the counts are summed
+        columns = columns or self.columns
+        with self._lock:
+            categories, codes, sizes = self.categories, self.codes, self.category_sizes
+        chunks = min(self.partition_count, max(1, len(rows) // COUNT_CHUNK_ROWS))
+        if chunks == 1:
+            counts = _count(codes, rows, columns, sizes)
+        else:
+            futures = [self.threads.submit(_count, codes, part, columns, sizes)
+                       for part in np.array_split(rows, chunks)]
+            counts = {col: np.zeros(sizes[col], dtype=np.int64) for col in columns}
+            for future in futures:
+                for col, partial in future.result().items():
+                    counts[col] += partial
+        return {col: self._series(counts[col], categories, col) for col in columns}
+
+    def on_refresh(self, store, delta):
+        # CatalogStore listener: apply the appended and tombstoned rows, or
+        # re-shard the refreshed frame when the store renumbered its rows
+        with store.lock:
+            df, fingerprint, order, live = store.df, store.fingerprint, store.order, store.live
+        if delta.compacted:
+            self.build(df, fingerprint, order)
+        else:
+            self.apply(df, delta.first_added, fingerprint, order, live)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False)
+        if self._threads is not None:
+            self._threads.shutdown(wait=False)
+        if self._directory:
+            shutil.rmtree(self._directory, ignore_errors=True)
@@ -0,0 +1,459 @@
+import hmac
+import io
+import logging
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import asdict, dataclass
+
+import numpy as np
+import pandas as pd
+
+from catalog_ingest import KEY_COLUMNS, combine_chunks, iter_records
+
+logger = logging.getLogger(__name__)
+
+# Share of tombstoned rows in the frame above which a refresh compacts it
+COMPACT_RATIO = float(os.environ.get('CATALOG_COMPACT_RATIO', 0.25))
+# Seconds between checks of the export's mtime and size (0 disables them)
+REFRESH_CHECK_SECONDS = float(os.environ.get('CATALOG_REFRESH_CHECK', 5))
+# Bearer token a POST to the refresh endpoint must carry (unset: no POSTs)
+REFRESH_TOKEN = os.environ.get('CATALOG_REFRESH_TOKEN')
+
+
+@dataclass
+class RefreshSummary:
+    version: int
+    rows_added: int
+    rows_removed: int
+    rows_changed: int
+    rows_total: int
+    seconds: float
+
+    def to_dict(self):
+        return asdict(self)
+
+
+@dataclass
+class CatalogDelta:
+    # Rows that left the catalog and rows that entered it; an edited row (same
+    # row key, new content) is in both, with its old and new version.
+    # removed_rows are the positions tombstoned, rows from first_added on
+    # were appended. compacted: positions were renumbered (row ids of the
+    # previous version are void). previous: the fingerprint before.
+    removed: pd.DataFrame
+    added: pd.DataFrame
+    summary: RefreshSummary
+    removed_rows: np.ndarray
+    first_added: int
+    compacted: bool
+    previous: str
+
+    def touches(self, filters):
+        # Whether a removed or added row matches filters ({column: value or
+        # list of values}), i.e. whether results for them may have changed
+        for frame in (self.removed, self.added):
+            if not len(frame):
+                continue
+            mask = np.ones(len(frame), dtype=bool)
+            for col, value in (filters or {}).items():
+                if value is None or value == '':
+                    continue
+                if col not in frame.columns:
+                    return True
+                values = value if isinstance(value, (list, tuple, set)) else [value]
+                mask &= frame[col].isin(values).to_numpy()
+            if mask.any():
+                return True
+        return False
+
+
+def _content_hashes(df):
+    # 64-bit hash of each row's content; identical rows hash alike
+    return pd.util.hash_pandas_object(df, index=False).values
+
+
+def _occurrence_keys(hashes):
+    # Hashes made unique across duplicates by mixing in the occurrence number,
+    # so identical rows (or records) are diffed as a multiset
+    hashes = pd.Series(hashes)
+    occurrence = hashes.groupby(hashes.values).cumcount()
+    return pd.util.hash_pandas_object(
+        pd.DataFrame({'hash': hashes.values, 'occurrence': occurrence.values}), index=False
+    ).values
+
+
+def _row_keys(df):
+    # One 64-bit key per row, unique per copy of a duplicated row
+    return _occurrence_keys(_content_hashes(df))
+
+
+def _hash_records(path):
+    # (header, occurrence keys of the data records) of a CSV export, hashed
+    # as raw bytes: no parsing, so a refresh finds what changed before
+    # paying for typed parsing of the changed records only
+    header = None
+    hashes = []
+    for records in iter_records(path):
+        if header is None:
+            header, records = records[0], records[1:]
+        hashes.append(pd.util.hash_array(np.array(records, dtype=object)) if records else
+                      np.array([], dtype=np.uint64))
+    return header, _occurrence_keys(np.concatenate(hashes) if hashes else np.array([], dtype=np.uint64))
+
+
+def _read_records(path, numbers):
+    # Header and the data records with the given (sorted) record numbers
+    header = None
+    wanted = []
+    base = 0
+    for records in iter_records(path):
+        if header is None:
+            header, records = records[0], records[1:]
+        for number in numbers[np.searchsorted(numbers, base):np.searchsorted(numbers, base + len(records))]:
+            wanted.append(records[number - base])
+        base += len(records)
+    return header, wanted
+
+
+def _stat(path):
+    # (mtime, size) of a source file, or None for anything else
+    try:
+        stat = os.stat(path)
+    except (OSError, TypeError, ValueError):
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _changed_rows(removed, added, row_key):
+    # Removed and added rows sharing a row key are edits of one report: the
+    # number of such pairs (0 without a row key in the catalog)
+    if not row_key or not set(row_key) <= set(removed.columns) or not len(removed) or not len(added):
+        return 0
+    old = pd.Series(pd.util.hash_pandas_object(removed[row_key], index=False).values).value_counts()
+    new = pd.Series(pd.util.hash_pandas_object(added[row_key], index=False).values).value_counts()
+    common = old.index.intersection(new.index)
+    return int(np.minimum(old[common].values, new[common].values).sum())
+
+
+def _hash_sum(hashes):
+    # Wrapping 64-bit sum: order-independent and updatable by the delta
+    return int(np.sum(hashes, dtype=np.uint64)) if len(hashes) else 0
+
+
+def _dimension_counts(df, columns=KEY_COLUMNS):
+    return {col: Counter(df[col].value_counts()[lambda counts: counts > 0].to_dict())
+            for col in columns if col in df.columns}
+
+
+def _value_counts(frame, col):
+    return frame[col].value_counts()[lambda c: c > 0].to_dict()
+
+
+class CatalogStore:
+    # In-memory catalog that can be refreshed from a new export by applying
+    # only the inserted/deleted rows; counts are kept per slicer column.
+    # row_key: columns identifying a report, to tell edits from new reports.
+    #
+    # For a CSV export loaded by load_catalog the raw records are hashed and
+    # mapped to rows, so a refresh diffs the raw records and parses only the
+    # new ones; removed rows are tombstoned (dead until compaction) and new
+    # ones appended, so existing row positions stay valid. Other loaders (or
+    # a changed header) fall back to reloading and diffing the parsed rows.
+
+    def __init__(self, loader, path, columns=KEY_COLUMNS, row_key=None):
+        self.loader = loader
+        self.columns = columns
+        self.row_key = row_key
+        self.path = path
+        self.lock = threading.RLock()
+        self._refreshing = threading.Lock()
+        self._checking = threading.Lock()
+        self.version = 0
+        self.last_refresh = None
+        self._listeners = []
+
+        started = time.perf_counter()
+        # (mtime, size) of the export as last read, taken before reading it
+        self._source_stat = _stat(path)
+        self._checked = time.monotonic()
+        df, records = self._load(path)
+        # Seconds the loader spent per phase (csv load, cleansing, ...)
+        self.load_timings = dict(df.attrs.get('timings', {}), **records.pop('timings', {}))
+        self._set_frame(df, records)
+        self.version = 1
+        self.last_refresh = RefreshSummary(self.version, len(self.df), 0, 0, len(self.df),
+                                           time.perf_counter() - started)
+
+    def _load(self, path):
+        # Loads the export, plus (in records) its raw record hashes and the
+        # record number of every row when they line up with the loaded rows
+        stat = _stat(path)
+        records = {}
+        if stat is not None:
+            hashed = time.perf_counter()
+            records['header'], records['keys'] = _hash_records(path)
+            records['timings'] = {'record hashes': time.perf_counter() - hashed}
+        df = self.loader(path)
+        index = df.index.to_numpy()
+        # The loader's index holds record numbers when it read the same file
+        # the hashes came from; anything else disables the record diff
+        read = len(records.get('keys', ()))
+        lined_up = ('keys' in records and _stat(path) == stat and df.attrs.get('rows_read') == read
+                    and index.dtype.kind == 'i' and (not len(index) or 0 <= index.min() <= index.max() < read))
+        if lined_up:
+            records['numbers'] = index
+        else:
+            records.pop('keys', None)
+        return df, records
+
+    def _set_frame(self, df, records):
+        self.df = df.reset_index(drop=True)
+        self.live = np.ones(len(self.df), dtype=bool)
+        self._hashes = _content_hashes(self.df)
+        self._sum = _hash_sum(self._hashes)
+        self.counts = _dimension_counts(self.df, self.columns)
+        self._header = records.get('header')
+        self._records = records.get('keys')
+        if self._records is not None:
+            # Row position of every raw record (-1: dropped by the loader)
+            self._record_rows = np.full(len(self._records), -1, dtype=np.int64)
+            self._record_rows[records['numbers']] = np.arange(len(self.df))
+        self._sort()
+
+    def _sort(self):
+        # Canonical row order: positions sorted by content hash. Every worker
+        # holding the same catalog lists its rows in the same order, however
+        # it got there (fresh load or refreshes), so results that list rows
+        # (table records, windows) can be shared between workers.
+        self.order = np.argsort(self._hashes, kind='stable')
+        self._ordered_hashes = self._hashes[self.order]
+
+    @property
+    def rows(self):
+        # Live rows (the frame also holds tombstoned ones until compaction)
+        return len(self.order)
+
+    @property
+    def fingerprint(self):
+        # Order-independent content hash of the live rows (and the column
+        # names): identical in every worker that holds the same data, so
+        # usable as a shared cache version
+        columns = zlib.crc32('\x1f'.join(map(str, self.df.columns)).encode())
+        return f"{self._sum:016x}-{self.rows}-{columns:08x}"
+
+    def subscribe(self, listener):
+        # listener(store, delta) is called after every refresh that changed rows
+        self._listeners.append(listener)
+        return listener
+
+    def refresh(self, path=None):
+        # Applies the changes of the export at path (default: the current
+        # one); refreshes run one at a time, listeners included
+        with self._refreshing:
+            started = time.perf_counter()
+            path = path or self.path
+            stat = _stat(path)
+            with self.lock:
+                previous = self.fingerprint
+                changes = self._record_changes(path)
+                if changes is None:
+                    changes = self._reload(path)
+                removed_rows, removed, added, compacted = changes
+                changed = bool(len(removed) or len(added) or compacted)
+
+                summary = RefreshSummary(self.version, len(added), len(removed), 0, self.rows, 0.0)
+                if changed:
+                    summary.rows_changed = _changed_rows(removed, added, self.row_key)
+                    summary.rows_added -= summary.rows_changed
+                    summary.rows_removed -= summary.rows_changed
+                    self.version += 1
+                    summary.version = self.version
+                first_added = len(self.df) - len(added)
+                self.path = path
+                self._source_stat = stat
+                summary.seconds = time.perf_counter() - started
+                self.last_refresh = summary
+
+            logger.info("Refreshed catalog from %s: +%d -%d ~%d rows%s (%.2fs)", path,
+                        summary.rows_added, summary.rows_removed, summary.rows_changed,
+                        ", compacted" if compacted else "", summary.seconds)
+            if changed:
+                delta = CatalogDelta(removed=removed, added=added, summary=summary, removed_rows=removed_rows,
+                                     first_added=first_added, compacted=compacted, previous=previous)
+                for listener in self._listeners:
+                    listener(self, delta)
+            return summary
+
+    def check_source(self):
+        # Starts a refresh in the background when the export's mtime or size
+        # moved since it was read. Every worker process holds its own store,
+        # and a POST reaches only one of them, so checking before requests
+        # (at most every REFRESH_CHECK_SECONDS) is how all of them converge on
+        # the new export. Returns whether a refresh was started.
+        if REFRESH_CHECK_SECONDS <= 0 or not self._checking.acquire(blocking=False):
+            return False
+        try:
+            now = time.monotonic()
+            if now - self._checked < REFRESH_CHECK_SECONDS:
+                return False
+            self._checked = now
+            stat = _stat(self.path)
+            if stat is None or stat == self._source_stat or self._refreshing.locked():
+                return False
+            threading.Thread(target=self._refresh_in_background, daemon=True).start()
+            return True
+        finally:
+            self._checking.release()
+
+    def _refresh_in_background(self):
+        try:
+            self.refresh()
+        except Exception:
+            logger.exception("Background refresh of %s failed", self.path)
+
+    def _record_changes(self, path):
+        # (removed rows, removed, added, compacted) from a diff of the raw
+        # records, or None when the export cannot be diffed that way
+        stat = _stat(path)
+        if self._records is None or stat is None:
+            return None
+        header, keys = _hash_records(path)
+        if header != self._header:
+            return None
+
+        # Records are unique (occurrence keys), so each new one has at most one old match
+        matches = pd.Index(self._records).get_indexer(keys)
+        gone = np.ones(len(self._records), dtype=bool)
+        gone[matches[matches >= 0]] = False
+        new_numbers = np.flatnonzero(matches < 0)
+
+        added = self._parse_records(path, new_numbers)
+        if added is None or _stat(path) != stat:
+            return None
+
+        removed_rows = self._record_rows[gone]
+        removed_rows = removed_rows[removed_rows >= 0]
+        record_rows = np.where(matches >= 0, self._record_rows[np.maximum(matches, 0)], -1)
+        record_rows[new_numbers[added.index.to_numpy()]] = len(self.df) + np.arange(len(added))
+        removed = self.df.iloc[removed_rows]
+        added = added.reset_index(drop=True)
+        self._apply(removed_rows, removed, added)
+        self._records, self._record_rows = keys, record_rows
+        return removed_rows, removed, added, self._compact_if_sparse()
+
+    def _parse_records(self, path, numbers):
+        # The loader's rows for the given raw records, typed like the current
+        # frame and indexed by position in numbers; None if they do not line up
+        if not len(numbers):
+            return self.df.iloc[:0]
+        header, records = _read_records(path, numbers)
+        added = self.loader(io.BytesIO(b'\n'.join([header] + records) + b'\n'))
+        if added.attrs.get('rows_read') != len(numbers) or list(added.columns) != list(self.df.columns):
+            return None
+        try:
+            return added.astype({col: dtype for col, dtype in self.df.dtypes.items()
+                                 if not isinstance(dtype, pd.CategoricalDtype) and added[col].dtype != dtype})
+        except (TypeError, ValueError):
+            return None
+
+    def _apply(self, removed_rows, removed, added):
+        # Tombstone removed rows and append added ones; positions of the
+        # remaining rows, and the codes of existing categories, do not change
+        # New arrays rather than in-place updates: the partitions keep
+        # answering from the previous ones until they take over the delta
+        self.live = self.live.copy()
+        self.live[removed_rows] = False
+        added_hashes = _content_hashes(added)
+        if len(added):
+            self.df = combine_chunks([self.df, added]).reset_index(drop=True)
+            self.live = np.concatenate([self.live, np.ones(len(added), dtype=bool)])
+            self._hashes = np.concatenate([self._hashes, added_hashes])
+        self._sum = (self._sum + _hash_sum(added_hashes) - _hash_sum(self._hashes[removed_rows])) % 2 ** 64
+
+        # The canonical order only loses the removed rows and gains the added
+        # ones, merged in by hash
+        keep = self.live[self.order]
+        order, ordered_hashes = self.order[keep], self._ordered_hashes[keep]
+        if len(added):
+            by_hash = np.argsort(added_hashes, kind='stable')
+            slots = np.searchsorted(ordered_hashes, added_hashes[by_hash], side='right')
+            order = np.insert(order, slots, len(self.df) - len(added) + by_hash)
+            ordered_hashes = np.insert(ordered_hashes, slots, added_hashes[by_hash])
+        self.order, self._ordered_hashes = order, ordered_hashes
+
+        # Aggregate counts only move by the churned rows
+        for col, counts in self.counts.items():
+            counts.subtract(_value_counts(removed, col))
+            counts.update(_value_counts(added, col))
+            for value in [value for value, count in counts.items() if count <= 0]:
+                del counts[value]
+
+    def _compact_if_sparse(self):
+        # Drops the tombstoned rows (renumbering positions) once they make up
+        # more than COMPACT_RATIO of the frame
+        if len(self.df) - self.rows <= COMPACT_RATIO * len(self.df):
+            return False
+        positions = np.full(len(self.df), -1, dtype=np.int64)
+        positions[self.order] = np.arange(self.rows)
+        frame = self.df.iloc[self.order].reset_index(drop=True)
+        for col in frame.columns:
+            if isinstance(frame[col].dtype, pd.CategoricalDtype):
+                frame[col] = frame[col].cat.remove_unused_categories()
+        self.df = frame
+        self.live = np.ones(self.rows, dtype=bool)
+        self._hashes = self._ordered_hashes
+        self.order = np.arange(self.rows)
+        if self._records is not None:
+            self._record_rows = np.where(self._record_rows >= 0, positions[np.maximum(self._record_rows, 0)], -1)
+        return True
+
+    def _reload(self, path):
+        # Full reload diffed on the parsed rows (content keys of the live
+        # rows); the new frame replaces the old one, so positions change
+        new_df, records = self._load(path)
+        records.pop('timings', None)
+        new_hashes = _content_hashes(new_df)
+        old_keys = _occurrence_keys(self._ordered_hashes)
+        new_keys = _occurrence_keys(new_hashes)
+        removed_rows = self.order[~np.isin(old_keys, new_keys)]
+        removed = self.df.iloc[removed_rows]
+        added = new_df.iloc[np.flatnonzero(~np.isin(new_keys, old_keys))].reset_index(drop=True)
+        if len(removed) or len(added) or list(new_df.columns) != list(self.df.columns):
+            self._set_frame(new_df, records)
+            return removed_rows, removed, added, True
+
+        # Same rows: the frame stays, only the raw records are mapped anew
+        # (each new row to the live row with the same key)
+        self._header = records.get('header')
+        self._records = records.get('keys')
+        if self._records is not None:
+            self._record_rows = np.full(len(self._records), -1, dtype=np.int64)
+            self._record_rows[records['numbers']] = self.order[pd.Index(old_keys).get_indexer(new_keys)]
+        return removed_rows, removed, added, False
+
+
+def register_refresh_route(server, store, rule='/catalog/refresh'):
+    # POST triggers an incremental refresh (with the CATALOG_REFRESH_TOKEN
+    # bearer token), GET returns the last summary. Every request also checks
+    # the export for changes, so workers the POST missed catch up on their own.
+    from flask import abort, jsonify, request
+
+    def catalog_refresh():
+        if request.method == 'POST':
+            given = request.headers.get('Authorization', '')
+            if not REFRESH_TOKEN or not hmac.compare_digest(given.encode(), f"Bearer {REFRESH_TOKEN}".encode()):
+                abort(403)
+            summary = store.refresh()
+        else:
+            summary = store.last_refresh
+        return jsonify(summary.to_dict())
+
+    def check_source():
+        store.check_source()
+
+    endpoint = 'catalog_refresh' + rule.replace('/', '_')
+    server.add_url_rule(rule, endpoint, catalog_refresh, methods=['GET', 'POST'])
+    server.before_request(check_source)
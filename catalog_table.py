@@ -0,0 +1,65 @@
+import math
+import os
+
+from dash import dash_table, exceptions
+from dash.dependencies import Input, Output, State
+
+# Report table mode: 'pages' ships every filtered row to the browser and pages
+# through them there, 'virtual' fetches one window of rows at a time from the
+# server as the user moves through the table
+TABLE_MODE = os.environ.get('CATALOG_TABLE_MODE', 'pages')
+WINDOW_ROWS = int(os.environ.get('CATALOG_TABLE_WINDOW', 500))
+PREFETCH_WINDOWS = int(os.environ.get('CATALOG_TABLE_PREFETCH', 1))
+
+
+def report_table(engine, filters, table_id, page_size=10, style_table=None, **kwargs):
+    # DataTable for the filtered catalog; kwargs are passed through (styles)
+    columns = [{'name': col, 'id': col} for col in engine.columns]
+    style_table = dict(style_table or {'overflowX': 'auto'})
+    if TABLE_MODE != 'virtual':
+        return dash_table.DataTable(id=table_id, data=engine.records(filters), columns=columns,
+                                    page_size=page_size, style_table=style_table, **kwargs)
+
+    # Only the rows of the current window are in the browser, and only the
+    # visible ones are rendered; register_table_windows fills in the data
+    total = engine.row_count(filters)
+    style_table.update({'height': '500px', 'overflowY': 'auto'})
+    return dash_table.DataTable(
+        id=table_id,
+        data=[],
+        columns=columns,
+        page_action='custom',
+        page_current=0,
+        page_size=WINDOW_ROWS,
+        page_count=max(1, math.ceil(total / WINDOW_ROWS)),
+        virtualization=True,
+        fixed_rows={'headers': True},
+        style_table=style_table,
+        **kwargs
+    )
+
+
+def register_table_windows(app, engine, table_id, selectors, make_filters=None, cross_filter=None):
+    # Serves the row window of a virtual report table from the engine's cached
+    # row ids; selectors: [(dropdown_id, column), ...]. make_filters(filters)
+    # adjusts the {column: dropdown value} filters (default: used as they are);
+    # cross_filter is the id of the page's chart cross-filter store, if any.
+    if TABLE_MODE != 'virtual':
+        return
+    extra_state = [State(cross_filter, 'data')] if cross_filter else []
+
+    @app.callback(
+        Output(table_id, 'data'),
+        [Input(table_id, 'page_current'),
+         Input(table_id, 'page_size')],
+        [State(dropdown_id, 'value') for dropdown_id, _ in selectors] + extra_state
+    )
+    def load_window(page_current, page_size, *values):
+        if page_size is None:
+            raise exceptions.PreventUpdate
+        cross = values[-1] if cross_filter else None
+        filters = {column: value for (_, column), value in zip(selectors, values)}
+        if make_filters is not None:
+            filters = make_filters(filters)
+        filters = {**filters, **(cross or {})}
+        return engine.window(filters, (page_current or 0) * page_size, page_size, prefetch=PREFETCH_WINDOWS)
@@ -0,0 +1,152 @@
+import json
+import os
+
+import pandas as pd
+from dash import callback_context, dcc, exceptions, html
+from dash.dependencies import ALL, MATCH, Input, Output, State
+
+# Bars drawn per chart before the remainder is rolled up into "Other"
+TOP_K = int(os.environ.get('CATALOG_CHART_TOP_K', 20))
+OTHER_LABEL = 'Other'
+
+
+def top_k_frame(counts, column, k=None, offset=0):
+    # counts: Series of report counts indexed by value, largest first.
+    # Returns ranks offset..offset+k plus one "Other" row for the rest.
+    k = k or TOP_K
+    counts = counts[counts > 0]
+    shown = counts.iloc[offset:offset + k]
+    rest = counts.iloc[offset + k:]
+
+    frame = pd.DataFrame({column: shown.index.astype(str), 'Count': shown.values, 'kind': 'value'})
+    if len(rest):
+        other = pd.DataFrame({column: [f"{OTHER_LABEL} ({len(rest)} more)"], 'Count': [int(rest.sum())],
+                              'kind': ['other']})
+        frame = pd.concat([frame, other], ignore_index=True)
+    return frame
+
+
+def top_k_figure(counts, column, title, k=None, offset=0, labels=None):
+    # plotly.express is slow to import, so load it on first use
+    import plotly.express as px
+
+    k = k or TOP_K
+    frame = top_k_frame(counts, column, k, offset)
+    if offset:
+        title = f"{title} (ranks {offset + 1}-{offset + k})"
+    figure = px.bar(frame, x=column, y='Count', title=title, labels=labels, custom_data=['kind'])
+    figure.update_xaxes(type='category')
+    return figure
+
+
+def topk_graph(counts, column, title, k=None, labels=None, figure=None, scope=''):
+    # Bar chart limited to the top K values, with the state needed to drill
+    # into "Other" (see register_topk_drilldown); figure may be prebuilt and
+    # scope keeps ids unique when several dashboards share one app
+    k = k or TOP_K
+    if figure is None:
+        figure = top_k_figure(counts, column, title, k, 0, labels)
+    chart = {'column': column, 'title': title, 'k': k, 'offset': 0, 'labels': labels}
+    return html.Div([
+        dcc.Store(id={'type': 'topk-state', 'scope': scope, 'column': column}, data=chart),
+        dcc.Graph(id={'type': 'topk-graph', 'scope': scope, 'column': column}, figure=figure),
+        html.Button(f"Show top {k}", id={'type': 'topk-reset', 'scope': scope, 'column': column}, n_clicks=0),
+    ])
+
+
+def register_topk_drilldown(app, counts_for, selectors, scope='', cross_filter=None, make_filters=None):
+    # counts_for(filters, column) returns the counts Series for the current
+    # slicer selections; selectors: [(dropdown_id, column), ...]; cross_filter
+    # is the id of the chart cross-filter store, if the page has one;
+    # make_filters(filters) adjusts the slicer filters
+    extra_state = [State(cross_filter, 'data')] if cross_filter else []
+
+    @app.callback(
+        [Output({'type': 'topk-graph', 'scope': scope, 'column': MATCH}, 'figure'),
+         Output({'type': 'topk-state', 'scope': scope, 'column': MATCH}, 'data')],
+        [Input({'type': 'topk-graph', 'scope': scope, 'column': MATCH}, 'clickData'),
+         Input({'type': 'topk-reset', 'scope': scope, 'column': MATCH}, 'n_clicks')],
+        [State({'type': 'topk-state', 'scope': scope, 'column': MATCH}, 'data')] +
+        [State(dropdown_id, 'value') for dropdown_id, _ in selectors] + extra_state
+    )
+    def drill_into_other(click_data, reset_clicks, chart, *values):
+        if not chart or not callback_context.triggered:
+            raise exceptions.PreventUpdate
+
+        if callback_context.triggered[0]['prop_id'].endswith('.n_clicks'):
+            if not chart['offset']:
+                raise exceptions.PreventUpdate
+            offset = 0
+        else:
+            point = (click_data or {}).get('points', [{}])[0]
+            if point.get('customdata', [None])[0] != 'other':
+                raise exceptions.PreventUpdate
+            offset = chart['offset'] + chart['k']
+
+        filters = {column: value for (_, column), value in zip(selectors, values)}
+        if make_filters is not None:
+            filters = make_filters(filters)
+        if cross_filter:
+            filters = chart_filters(filters, values[-1], chart['column'])
+        counts = counts_for(filters, chart['column'])
+        figure = top_k_figure(counts, chart['column'], chart['title'], chart['k'], offset, chart['labels'])
+        return figure, dict(chart, offset=offset)
+
+
+def chart_filters(filters, cross, column):
+    # Filters for one chart: the slicers plus every chart cross-filter except
+    # the chart's own column, so the clicked chart keeps showing all its bars
+    return {**filters, **{col: value for col, value in (cross or {}).items() if col != column}}
+
+
+def cross_filter_controls(scope=''):
+    # Store of {column: value} picked by clicking chart bars, and a summary
+    # with a button to clear it (see register_cross_filter)
+    return html.Div([
+        dcc.Store(id=scope + 'cross_filter', data={}),
+        html.Span(id=scope + 'cross_filter_summary', style={"marginRight": "10px"}),
+        html.Button("Clear chart filters", id=scope + 'cross_filter_clear', n_clicks=0),
+    ], style={"marginBottom": "10px"})
+
+
+def cross_filter_inputs(scope=''):
+    # Inputs that change the chart cross-filter: bar clicks on any top-K chart
+    # and the clear button (see next_cross_filter)
+    return [Input({'type': 'topk-graph', 'scope': scope, 'column': ALL}, 'clickData'),
+            Input(scope + 'cross_filter_clear', 'n_clicks')]
+
+
+def next_cross_filter(triggered, cross, reset_ids):
+    # Cross-filter after the inputs that fired (callback_context.triggered):
+    # clicking a value bar toggles its value ("Other" bars drill down
+    # instead), a slicer change or the clear button (reset_ids) resets it.
+    # Returns None while it stays as it is, e.g. for charts being re-rendered.
+    cross = cross or {}
+    if any(trigger['prop_id'].rsplit('.', 1)[0] in reset_ids for trigger in triggered):
+        return {} if cross else None
+    for trigger in triggered:
+        if not trigger['prop_id'].endswith('.clickData'):
+            continue
+        point = (trigger['value'] or {}).get('points', [{}])[0]
+        if point.get('customdata', [None])[0] != 'value':
+            continue
+        column = json.loads(trigger['prop_id'].rsplit('.', 1)[0])['column']
+        value = point['x']
+        if cross.get(column) == value:
+            return {col: picked for col, picked in cross.items() if col != column}
+        return dict(cross, **{column: value})
+    return None
+
+
+def register_cross_filter(app, scope=''):
+    # Summary of the picked chart filters; the filters themselves are updated
+    # by the page's main callback (cross_filter_inputs, next_cross_filter) so
+    # a slicer change resets them and recomputes the page in one round trip
+    @app.callback(
+        Output(scope + 'cross_filter_summary', 'children'),
+        [Input(scope + 'cross_filter', 'data')]
+    )
+    def show_cross_filter(cross):
+        if not cross:
+            return "Click a bar to filter the table and the other charts."
+        return "Chart filters: " + ", ".join(f"{col} = {value}" for col, value in cross.items())
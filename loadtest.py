@@ -0,0 +1,266 @@
+import argparse
+import csv
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+# Load-testing harness: runs a dashboard variant locally against a synthetic
+# catalog and replays slicer-click sequences as concurrent POSTs to
+# /_dash-update-component, reporting throughput and latency per callback.
+#
+#   python loadtest.py --variant V8.py --rows 200000 --sessions 64 --concurrency 16
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+VARIANTS = ['DASH.py', 'DASHV2.py', 'GreyDSH.py', 'V4.py', 'V7.sql', 'V8.py', 'V10.sql']
+SELECTORS = ['server_selector', 'db_selector', 'schema_selector', 'data_mart_selector']
+
+# Values the CMP_DATA cleansing keeps, plus a few it filters out
+DBS = ["AAD", "WSS_DM", "me_wsl_01", "aw_wsl_01", "ARCH", "WSS_APTOS", "TEMPDB", "STAGING"]
+SCHEMAS = ["dbo", "mer", "stg"]
+
+# Runs inside the child process: import the variant without its __main__
+# block, build its standalone app and serve it on the requested port
+BOOTSTRAP = """
+import runpy, sys
+sys.path.insert(0, sys.argv[1])
+app = runpy.run_path(sys.argv[2], run_name='loadtest')['create_app']()
+app.run(host='127.0.0.1', port=int(sys.argv[3]), debug=False, threaded=True)
+"""
+
+
+def write_synthetic_catalog(directory, rows, servers, data_marts, seed):
+    # Same file under both names the variants read
+    rng = random.Random(seed)
+    server_names = [f"SRV{number:04d}" for number in range(servers)]
+    mart_names = [f"DM_{number:05d}" for number in range(data_marts)]
+    sample = []
+    path = os.path.join(directory, 'CMP_DATA.csv')
+    with open(path, 'w', newline='', encoding='latin1') as handle:
+        writer = csv.writer(handle)
+        writer.writerow(['SERVER', 'DB', 'SCHEMA', 'DATA MART', 'REPORT NAME', 'PATH'])
+        for number in range(rows):
+            # Skewed picks so a few servers/marts dominate, like the real catalog
+            server = server_names[min(int(rng.paretovariate(1.2)) - 1, servers - 1)]
+            mart = mart_names[min(int(rng.paretovariate(1.1)) - 1, data_marts - 1)]
+            row = [server, rng.choice(DBS), rng.choice(SCHEMAS), mart,
+                   f"Report {number}", f"/{server}/{mart}/Report {number}"]
+            writer.writerow(row)
+            if row[1] in DBS[:6] and row[2] in SCHEMAS[:2] and len(sample) < 10_000:
+                sample.append(row[:4])
+    with open(path, 'rb') as source, open(os.path.join(directory, 'FullInp.csv'), 'wb') as target:
+        target.write(source.read())
+    return sample
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_variant(variant, data_dir, port, startup_timeout):
+    # Each variant run gets its own empty shared cache, so no run measures
+    # results another variant (or an earlier run) left in the default one
+    cache_path = os.path.join(data_dir, f"cache-{os.path.splitext(variant)[0]}-{port}.sqlite")
+    env = dict(os.environ, CATALOG_CACHE_URL=f"sqlite:///{cache_path}")
+    process = subprocess.Popen(
+        [sys.executable, '-c', BOOTSTRAP, REPO_DIR, os.path.join(REPO_DIR, variant), str(port)],
+        cwd=data_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + startup_timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{variant} exited with code {process.returncode} during startup")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/_dash-layout", timeout=2).read()
+            return process
+        except (urllib.error.URLError, ConnectionError, socket.timeout):
+            time.sleep(0.5)
+    process.terminate()
+    raise RuntimeError(f"{variant} did not start within {startup_timeout}s")
+
+
+def parse_outputs(output):
+    # "..a.options...b.children.." for multi-output callbacks, "a.children" otherwise
+    if output.startswith('..'):
+        parts = output[2:-2].split('...')
+        return [dict(zip(('id', 'property'), part.rsplit('.', 1))) for part in parts]
+    return dict(zip(('id', 'property'), output.rsplit('.', 1)))
+
+
+def load_callbacks(base_url):
+    with urllib.request.urlopen(f"{base_url}/_dash-dependencies", timeout=10) as response:
+        dependencies = json.load(response)
+    callbacks = []
+    for dependency in dependencies:
+        # Only replay callbacks driven by the slicers
+        if not any(item['id'] in SELECTORS and item['property'] == 'value' for item in dependency['inputs']):
+            continue
+        callbacks.append(dependency)
+    return callbacks
+
+
+class Results:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latencies = defaultdict(list)
+        self.errors = defaultdict(int)
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.latencies[name].append(seconds)
+            if not ok:
+                self.errors[name] += 1
+
+
+def fire(base_url, callback, selections, changed, results, timeout):
+    def values(items):
+        # Pattern-matching inputs (chart clicks) match no component yet
+        return [[] if item['id'].startswith('{') else dict(item, value=selections.get(item['id']))
+                for item in items]
+
+    payload = {
+        'output': callback['output'],
+        'outputs': parse_outputs(callback['output']),
+        'inputs': values(callback['inputs']),
+        'state': values(callback.get('state', [])),
+        'changedPropIds': [f"{changed}.value"],
+    }
+    request = urllib.request.Request(
+        f"{base_url}/_dash-update-component", data=json.dumps(payload).encode(),
+        headers={'Content-Type': 'application/json'}, method='POST',
+    )
+    started = time.perf_counter()
+    ok = True
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            ok = response.status in (200, 204)
+    except urllib.error.HTTPError as error:
+        # 204 No Content is PreventUpdate, anything else is a failure
+        ok = error.code == 204
+    except (urllib.error.URLError, ConnectionError, socket.timeout):
+        ok = False
+    results.record(callback['output'], time.perf_counter() - started, ok)
+
+
+def run_session(base_url, callbacks, sample, clicks, think_time, seed, results, timeout):
+    # Drill down server -> DB -> schema -> data mart along a real row, then
+    # back out again, firing every callback the changed slicer feeds
+    rng = random.Random(seed)
+    selections = {}
+    for click in range(clicks):
+        depth = click % (2 * len(SELECTORS))
+        if depth == 0:
+            row = rng.choice(sample)
+            selections = {}
+        if depth < len(SELECTORS):
+            changed = SELECTORS[depth]
+            selections[changed] = row[depth]
+        else:
+            changed = SELECTORS[2 * len(SELECTORS) - depth - 1]
+            selections[changed] = None
+        for callback in callbacks:
+            if any(item['id'] == changed for item in callback['inputs']):
+                fire(base_url, callback, selections, changed, results, timeout)
+        if think_time:
+            time.sleep(rng.uniform(0, think_time))
+
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def summarize(variant, rows, results, elapsed):
+    report = {'variant': variant, 'rows': rows, 'seconds': elapsed, 'callbacks': {}}
+    total = sum(len(latencies) for latencies in results.latencies.values())
+    report['throughput'] = total / elapsed if elapsed else 0.0
+    for name, latencies in sorted(results.latencies.items()):
+        report['callbacks'][name] = {
+            'requests': len(latencies),
+            'error_rate': results.errors[name] / len(latencies),
+            'p50_ms': percentile(latencies, 0.50) * 1000,
+            'p95_ms': percentile(latencies, 0.95) * 1000,
+            'p99_ms': percentile(latencies, 0.99) * 1000,
+        }
+    return report
+
+
+def print_report(report):
+    print(f"\n{report['variant']} ({report['rows']} rows): "
+          f"{report['throughput']:.1f} req/s over {report['seconds']:.1f}s")
+    print(f"  {'callback':<70} {'reqs':>6} {'err%':>6} {'p50ms':>8} {'p95ms':>8} {'p99ms':>8}")
+    for name, stats in report['callbacks'].items():
+        print(f"  {name[:70]:<70} {stats['requests']:>6} {stats['error_rate'] * 100:>6.1f} "
+              f"{stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} {stats['p99_ms']:>8.1f}")
+
+
+def run_variant(variant, rows, args, data_dir, sample):
+    port = free_port()
+    process = start_variant(variant, data_dir, port, args.startup_timeout)
+    try:
+        base_url = f"http://127.0.0.1:{port}"
+        callbacks = load_callbacks(base_url)
+        results = Results()
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            futures = [
+                pool.submit(run_session, base_url, callbacks, sample, args.clicks,
+                            args.think_time, args.seed + session, results, args.timeout)
+                for session in range(args.sessions)
+            ]
+            for future in futures:
+                future.result()
+        return summarize(variant, rows, results, time.perf_counter() - started)
+    finally:
+        process.terminate()
+        process.wait(timeout=10)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-user load test for the catalog dashboards")
+    parser.add_argument('--variant', action='append', choices=VARIANTS,
+                        help="dashboard to test (repeatable, default: all)")
+    parser.add_argument('--rows', type=int, action='append',
+                        help="synthetic catalog size (repeatable, default: 100000)")
+    parser.add_argument('--servers', type=int, default=50)
+    parser.add_argument('--data-marts', type=int, default=2000)
+    parser.add_argument('--sessions', type=int, default=32, help="simulated users")
+    parser.add_argument('--concurrency', type=int, default=8, help="sessions running at once")
+    parser.add_argument('--clicks', type=int, default=16, help="slicer changes per session")
+    parser.add_argument('--think-time', type=float, default=0.0, help="max pause between clicks (s)")
+    parser.add_argument('--timeout', type=float, default=60.0, help="per-request timeout (s)")
+    parser.add_argument('--startup-timeout', type=float, default=300.0)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--json', help="write the full report to this file")
+    args = parser.parse_args(argv)
+
+    reports = []
+    for rows in args.rows or [100_000]:
+        with tempfile.TemporaryDirectory(prefix='catalog-loadtest-') as data_dir:
+            sample = write_synthetic_catalog(data_dir, rows, args.servers, args.data_marts, args.seed)
+            if not sample:
+                parser.error("synthetic catalog has no rows that survive the cleansing rules")
+            for variant in args.variant or VARIANTS:
+                report = run_variant(variant, rows, args, data_dir, sample)
+                print_report(report)
+                reports.append(report)
+
+    if args.json:
+        with open(args.json, 'w') as handle:
+            json.dump(reports, handle, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+import bisect
+import heapq
+import itertools
+import json
+import os
+import threading
+from collections import OrderedDict
+
+from dash.dependencies import Input, Output, State
+
+from catalog_ingest import KEY_COLUMNS
+
+# Dropdown options mode: 'full' ships every distinct value, 'search' answers
+# search_value queries with the top-N matches ranked by report count
+SEARCH_DROPDOWNS = os.environ.get('CATALOG_DROPDOWN_MODE', 'full') == 'search'
+
+# Options returned per dropdown response in search mode
+DEFAULT_LIMIT = 50
+
+# Cascade combinations whose ranked option lists are kept in memory
+CACHE_SIZE = 256
+
+# Values checked (most reported first) for substring matches when the prefix
+# matches do not fill a response; 0 turns the substring fallback off
+SUBSTRING_SCAN = int(os.environ.get('CATALOG_OPTION_SUBSTRING_SCAN', 20_000))
+
+
+class _Entry:
+    # Distinct values of one column sorted by lowercase text for prefix
+    # lookups, plus the same values ranked by report count for empty queries
+
+    def __init__(self, counts):
+        items = sorted(((str(value).lower(), value, count) for value, count in counts.items()),
+                       key=lambda item: item[0])
+        self.keys = [item[0] for item in items]
+        self.values = [item[1] for item in items]
+        self.counts = [item[2] for item in items]
+        self.by_count = sorted(range(len(items)), key=lambda position: -self.counts[position])
+        self.ranked = [self.values[position] for position in self.by_count]
+
+    def search(self, query, limit):
+        if not query:
+            return self.ranked[:limit]
+
+        query = query.lower()
+        start = bisect.bisect_left(self.keys, query)
+        stop = bisect.bisect_right(self.keys, query + '\uffff')
+        best = heapq.nlargest(limit, range(start, stop), key=self.counts.__getitem__)
+
+        # Fill up with substring matches when the prefix range is short,
+        # checking the most reported values first and at most SUBSTRING_SCAN
+        # of them, so a keystroke never walks every distinct value
+        if len(best) < limit and SUBSTRING_SCAN:
+            others = (position for position in itertools.islice(self.by_count, SUBSTRING_SCAN)
+                      if query in self.keys[position] and not start <= position < stop)
+            best += itertools.islice(others, limit - len(best))
+        return [self.values[position] for position in best]
+
+
+class OptionIndex:
+    # Answers dropdown search_value queries with the top-N matching values,
+    # ranked by report count, instead of shipping every distinct value.
+    # counts_for(filters) returns {column: Series of report counts} (the
+    # engine's cached, partition-parallel counts), so a cascade combination is
+    # never rescanned here.
+
+    def __init__(self, counts_for, columns=KEY_COLUMNS, limit=DEFAULT_LIMIT):
+        self.counts_for = counts_for
+        self.columns = columns
+        self.limit = limit
+        self._lock = threading.Lock()
+        self._cache = OrderedDict()
+        self._generation = 0
+
+    def on_refresh(self, store, delta):
+        # CatalogStore listener: entries are rebuilt lazily from the new counts
+        self.invalidate()
+
+    def invalidate(self, touched=None):
+        # Drops the entries whose filters pass touched(filters) (all without
+        # it); entries being built meanwhile are not kept
+        with self._lock:
+            if touched is None:
+                self._cache.clear()
+            else:
+                for key in [key for key in self._cache if touched(json.loads(key)[1])]:
+                    del self._cache[key]
+            self._generation += 1
+
+    def _entry(self, column, filters, allowed=None):
+        filters = {col: value for col, value in (filters or {}).items() if value}
+        key = json.dumps([column, filters, sorted(allowed, key=str) if allowed is not None else None],
+                         sort_keys=True, default=str)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+            generation = self._generation
+
+        counts = self.counts_for(filters)[column]
+        counts = counts[counts > 0]
+        if allowed is not None:
+            counts = counts[counts.index.isin(allowed)]
+        entry = _Entry(counts.to_dict())
+
+        with self._lock:
+            # Not kept if the catalog was refreshed while it was being built
+            if generation == self._generation:
+                self._cache[key] = entry
+                if len(self._cache) > CACHE_SIZE:
+                    self._cache.popitem(last=False)
+        return entry
+
+    def search(self, column, query='', filters=None, limit=None, allowed=None):
+        return self._entry(column, filters, allowed).search(query, limit or self.limit)
+
+    def options(self, column, query='', filters=None, selected=None, allowed=None):
+        values = self.search(column, query, filters, allowed=allowed)
+        # Keep the current selection visible even when it is not a top match
+        if selected is not None and selected not in values:
+            values = [selected] + values
+        return [{'label': value, 'value': value} for value in values]
+
+
+def register_search_dropdowns(app, index, selectors, make_filters=None, allowed=None, cascade=True):
+    # selectors: [(dropdown_id, column), ...] in cascade order; with cascade
+    # each dropdown is narrowed by the selections of the dropdowns before it.
+    # make_filters(filters) adjusts those filters (as for the table), allowed
+    # ({column: values}) limits the options of a dropdown.
+    allowed = allowed or {}
+    for position, (dropdown_id, column) in enumerate(selectors):
+        upstream = selectors[:position] if cascade else []
+
+        def update_options(search_value, *args, column=column, upstream=upstream):
+            *upstream_values, selected = args
+            filters = {col: value for (_, col), value in zip(upstream, upstream_values)}
+            if make_filters is not None and filters:
+                filters = make_filters(filters)
+            return index.options(column, search_value or '', filters, selected, allowed.get(column))
+
+        app.callback(
+            Output(dropdown_id, 'options'),
+            [Input(dropdown_id, 'search_value')] + [Input(upstream_id, 'value') for upstream_id, _ in upstream],
+            [State(dropdown_id, 'value')]
+        )(update_options)
@@ -0,0 +1,292 @@
+import json
+import logging
+import os
+import pickle
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Where the shared tier lives: sqlite:///path/to/file, redis://host:port/db or none
+CACHE_URL = os.environ.get('CATALOG_CACHE_URL',
+                           'sqlite:///' + os.path.join(tempfile.gettempdir(), 'catalog-cache.sqlite'))
+CACHE_TTL = float(os.environ.get('CATALOG_CACHE_TTL', 3600))
+CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 10_000))
+# Larger values are not written to the shared tier (they are cheaper to
+# recompute than to pickle and copy through it on every request)
+CACHE_MAX_ENTRY_BYTES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRY_BYTES', 4 * 1024 * 1024))
+
+# Entries kept per process in front of the shared tier, and their total size
+LOCAL_SIZE = 256
+LOCAL_MAX_BYTES = int(os.environ.get('CATALOG_CACHE_LOCAL_BYTES', 256 * 1024 * 1024))
+
+# Items of a list pickled to estimate its size
+SIZE_SAMPLE = 100
+
+# Keys copied per statement when carrying entries over to a new version
+CARRY_BATCH = 500
+
+
+def estimate_size(value):
+    # Approximate size in bytes: arrays report it, long lists (table records)
+    # are extrapolated from a sample, anything else is pickled
+    if hasattr(value, 'nbytes'):
+        return int(value.nbytes)
+    if isinstance(value, list) and len(value) > SIZE_SAMPLE:
+        return len(pickle.dumps(value[:SIZE_SAMPLE], protocol=pickle.HIGHEST_PROTOCOL)) * len(value) // SIZE_SAMPLE
+    return len(pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL))
+
+
+class SqliteCache:
+    # Shared on-disk tier: every worker on the host opens the same file
+
+    def __init__(self, path, ttl=CACHE_TTL, max_entries=CACHE_MAX_ENTRIES):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._local = threading.local()
+        self._writes = 0
+        with self._connection() as connection:
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries ("
+                "version TEXT, key TEXT, value BLOB, expires REAL, created REAL, PRIMARY KEY (version, key))"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_created ON entries (created)")
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def get(self, version, key):
+        row = self._connection().execute(
+            "SELECT value FROM entries WHERE key = ? AND version = ? AND expires > ?",
+            (key, version, time.time()),
+        ).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def set(self, version, key, value):
+        now = time.time()
+        self._connection().execute(
+            "INSERT OR REPLACE INTO entries (key, version, value, expires, created) VALUES (?, ?, ?, ?, ?)",
+            (key, version, pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL), now + self.ttl, now),
+        )
+        self._writes += 1
+        if self._writes % 100 == 0:
+            self.evict()
+
+    def evict(self):
+        # Drop expired entries, then the oldest ones beyond max_entries
+        connection = self._connection()
+        connection.execute("DELETE FROM entries WHERE expires <= ?", (time.time(),))
+        connection.execute(
+            "DELETE FROM entries WHERE (version, key) IN "
+            "(SELECT version, key FROM entries ORDER BY created DESC LIMIT -1 OFFSET ?)",
+            (self.max_entries,),
+        )
+
+    def carry_over(self, old, new, keep):
+        # Copy the unexpired entries of version old whose key passes keep(key)
+        # to version new (entries another worker already wrote stay)
+        connection = self._connection()
+        keys = [key for (key,) in connection.execute(
+            "SELECT key FROM entries WHERE version = ? AND expires > ?", (old, time.time())
+        ) if keep(key)]
+        for start in range(0, len(keys), CARRY_BATCH):
+            batch = keys[start:start + CARRY_BATCH]
+            connection.execute(
+                "INSERT OR IGNORE INTO entries (version, key, value, expires, created) "
+                "SELECT ?, key, value, expires, created FROM entries "
+                f"WHERE version = ? AND key IN ({', '.join('?' * len(batch))})",
+                (new, old, *batch),
+            )
+        return len(keys)
+
+    def invalidate(self, keep_versions=(), namespace=''):
+        # Remove the entries of the versions starting with namespace, except
+        # keep_versions (other datasets sharing the file are left alone)
+        keep_versions = list(keep_versions)
+        self._connection().execute(
+            "DELETE FROM entries WHERE substr(version, 1, length(?)) = ? "
+            f"AND version NOT IN ({', '.join('?' * len(keep_versions)) or 'NULL'})",
+            (namespace, namespace, *keep_versions),
+        )
+
+
+class RedisCache:
+    # Optional network tier with the same interface; needs the redis package.
+    # Entries of older dataset versions are unreachable and expire via TTL.
+
+    def __init__(self, url, ttl=CACHE_TTL, prefix='catalog'):
+        import redis
+
+        self.client = redis.Redis.from_url(url)
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def _key(self, version, key):
+        return f"{self.prefix}:{version}:{key}"
+
+    def get(self, version, key):
+        value = self.client.get(self._key(version, key))
+        return None if value is None else pickle.loads(value)
+
+    def set(self, version, key, value):
+        self.client.set(self._key(version, key), pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL),
+                        ex=int(self.ttl))
+
+    def carry_over(self, old, new, keep):
+        prefix = self._key(old, '')
+        carried = 0
+        for name in self.client.scan_iter(f"{prefix}*"):
+            key = name.decode()[len(prefix):]
+            if not keep(key):
+                continue
+            value, ttl = self.client.get(name), self.client.ttl(name)
+            if value is not None and ttl > 0:
+                self.client.set(self._key(new, key), value, ex=ttl, nx=True)
+                carried += 1
+        return carried
+
+    def invalidate(self, keep_versions=(), namespace=''):
+        kept = tuple(self._key(version, '') for version in keep_versions)
+        for name in self.client.scan_iter(f"{self.prefix}:{namespace}*"):
+            if not name.decode().startswith(kept):
+                self.client.delete(name)
+
+
+def open_shared_cache(url=CACHE_URL):
+    if not url or url == 'none':
+        return None
+    if url.startswith('sqlite:///'):
+        return SqliteCache(url[len('sqlite:///'):])
+    if url.startswith(('redis://', 'rediss://')):
+        return RedisCache(url)
+    raise ValueError(f"Unsupported cache URL: {url}")
+
+
+class TieredCache:
+    # Per-process LRU in front of the shared tier; keys are (dataset version,
+    # kind, filters, params) so a refresh never serves stale results. params
+    # holds whatever else the value depends on (chart, page, dataset view).
+    # Every version starts with namespace, so a refresh only invalidates the
+    # entries of its own dataset in a shared tier used by several.
+
+    def __init__(self, version, shared=None, local_size=LOCAL_SIZE, namespace='',
+                 local_bytes=LOCAL_MAX_BYTES, max_entry_bytes=CACHE_MAX_ENTRY_BYTES, positional=()):
+        # positional: kinds whose values are row positions, void once the
+        # dataset renumbers its rows
+        self.version = version
+        self.namespace = namespace
+        self.positional = set(positional)
+        self._current = version()
+        self.shared = shared
+        self.local_size = local_size
+        self.local_bytes = local_bytes
+        self.max_entry_bytes = max_entry_bytes
+        self._local = OrderedDict()
+        self._sizes = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = {'local': 0, 'shared': 0, 'miss': 0}
+
+    @staticmethod
+    def key(kind, filters, params=None):
+        return json.dumps([kind, filters, params], sort_keys=True, default=str)
+
+    def peek(self, kind, filters, params=None):
+        # Value from the local tier only, or None; never computes
+        key = (self.version(), self.key(kind, filters, params))
+        with self._lock:
+            return self._local.get(key)
+
+    def get_or_compute(self, kind, filters, compute, shared=True, params=None):
+        # shared=False keeps the value in this process only, for results that
+        # depend on how this process laid out the dataset (row positions)
+        version = self.version()
+        key = self.key(kind, filters, params)
+        shared = self.shared if shared else None
+
+        with self._lock:
+            if (version, key) in self._local:
+                self._local.move_to_end((version, key))
+                self.hits['local'] += 1
+                return self._local[(version, key)]
+
+        value = None
+        if shared is not None:
+            try:
+                value = shared.get(version, key)
+            except Exception:
+                logger.exception("Shared cache read failed for %s", key)
+        if value is not None:
+            self.hits['shared'] += 1
+            size = estimate_size(value)
+        else:
+            self.hits['miss'] += 1
+            value = compute()
+            size = estimate_size(value)
+            if shared is not None and size <= self.max_entry_bytes:
+                try:
+                    shared.set(version, key, value)
+                except Exception:
+                    logger.exception("Shared cache write failed for %s", key)
+
+        with self._lock:
+            if (version, key) in self._local:
+                self._bytes -= self._sizes[(version, key)]
+            self._local[(version, key)] = value
+            self._sizes[(version, key)] = size
+            self._bytes += size
+            # Oldest entries go first, by count and by size; the newest one
+            # always stays, however large
+            while len(self._local) > 1 and (len(self._local) > self.local_size or self._bytes > self.local_bytes):
+                old, _ = self._local.popitem(last=False)
+                self._bytes -= self._sizes.pop(old)
+        return value
+
+    def on_refresh(self, store, delta):
+        # CatalogStore listener: entries for filters no changed row matches
+        # (delta.touches) are still right, so they move to the new version in
+        # both tiers; the rest are dropped. Positional entries go too when the
+        # rows were renumbered. Nothing is deleted from the shared tier: its
+        # versions are content fingerprints, so entries of older versions stay
+        # right for workers that have not caught up yet, and expire via TTL.
+        old, new = self._current, self.version()
+        self._current = new
+        touched = {}
+
+        def keep(key):
+            try:
+                kind, filters, _ = json.loads(key)
+            except ValueError:
+                return False
+            if delta.compacted and kind in self.positional:
+                return False
+            signature = json.dumps(filters, sort_keys=True)
+            if signature not in touched:
+                touched[signature] = delta.touches(filters)
+            return not touched[signature]
+
+        with self._lock:
+            local, sizes = OrderedDict(), {}
+            for (version, key), value in self._local.items():
+                if version == new or (version == old and (new, key) not in self._local and keep(key)):
+                    local[(new, key)] = value
+                    sizes[(new, key)] = self._sizes[(version, key)]
+            self._local, self._sizes = local, sizes
+            self._bytes = sum(sizes.values())
+        carried = len(local)
+        if self.shared is not None:
+            try:
+                carried = self.shared.carry_over(old, new, keep)
+            except Exception:
+                logger.exception("Shared cache carry-over failed for %s", new)
+        logger.info("Carried %d cache entries over to %s", carried, new)
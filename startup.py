@@ -0,0 +1,38 @@
+import logging
+import time
+
+# Import this module before anything else so the "imports" phase covers the
+# dashboard's own imports
+STARTED = time.perf_counter()
+
+logger = logging.getLogger(__name__)
+
+
+class StartupProfile:
+    # Per-phase startup breakdown: each mark() closes the phase that began at
+    # the previous mark (the first one at import of this module)
+
+    def __init__(self, name):
+        self.name = name
+        self.phases = []
+        self._last = STARTED
+
+    def mark(self, phase, breakdown=None):
+        # breakdown: {sub-phase: seconds} measured within this phase (e.g. the
+        # csv load and cleansing of a catalog load); the remaining time is
+        # reported as phase. Ignored when it covers more than the phase took
+        # (an engine loaded earlier for another page).
+        now = time.perf_counter()
+        elapsed = now - self._last
+        measured = sum((breakdown or {}).values())
+        if breakdown and measured <= elapsed:
+            self.phases.extend(breakdown.items())
+            elapsed -= measured
+        self.phases.append((phase, elapsed))
+        self._last = now
+
+    def report(self):
+        total = sum(seconds for _, seconds in self.phases)
+        breakdown = ', '.join(f"{phase} {seconds:.2f}s" for phase, seconds in self.phases)
+        logger.info("%s started in %.2fs (%s)", self.name, total, breakdown)
+        return dict(self.phases, total=total)
@@ -0,0 +1,88 @@
+import threading
+import time
+
+import pandas as pd
+import pytest
+
+from catalog_export import ExportManager
+
+
+class Engine:
+    # The parts of a CatalogEngine an export reads; take() blocks until
+    # released, so a test can see a job while it runs
+    name = 'test'
+
+    def __init__(self):
+        self.version = 'v1'
+        self.release = threading.Event()
+        self.frame = pd.DataFrame({'SERVER': ['a', 'b', 'a'], 'PATH': ['/1', '/2', '/3']})
+
+    def row_count(self, filters):
+        return len(self.row_ids(filters))
+
+    def row_ids(self, filters):
+        frame = self.frame
+        if filters.get('SERVER'):
+            frame = frame[frame['SERVER'] == filters['SERVER']]
+        return frame.index.to_numpy()
+
+    def take(self, rows):
+        self.release.wait(5)
+        return self.frame.iloc[rows]
+
+
+def wait_for(manager, job_id):
+    for _ in range(500):
+        status = manager.status(job_id)
+        if status['status'] in ('done', 'failed'):
+            return status
+        time.sleep(0.01)
+    raise AssertionError(f"export {job_id} did not finish")
+
+
+@pytest.fixture
+def engine():
+    return Engine()
+
+
+@pytest.fixture
+def manager(engine, tmp_path):
+    return ExportManager(engine, directory=str(tmp_path), workers=1)
+
+
+def test_repeated_requests_join_the_running_job(manager, engine):
+    job_id = manager.request({'SERVER': 'a'}, 'csv')
+    assert manager.request({'SERVER': 'a', 'DB': None}, 'csv') == job_id
+    assert len(manager._jobs) == 1
+    engine.release.set()
+    status = wait_for(manager, job_id)
+    assert (status['status'], status['rows_written'], status['total']) == ('done', 2, 2)
+
+
+def test_finished_exports_are_reused(manager, engine):
+    engine.release.set()
+    job_id = manager.request({}, 'csv')
+    wait_for(manager, job_id)
+    path, fmt = manager.artifact(job_id)
+    written = pd.read_csv(path)
+    assert fmt == 'csv' and list(written['PATH']) == ['/1', '/2', '/3']
+
+    # Another worker using the same directory reuses the file too
+    other = ExportManager(engine, directory=manager.directory, workers=1)
+    assert other.request({}, 'csv') == job_id
+    assert other._jobs == {}
+
+
+def test_filters_format_and_version_make_separate_jobs(manager, engine):
+    engine.release.set()
+    first = manager.request({}, 'csv')
+    assert manager.request({'SERVER': 'b'}, 'csv') != first
+    assert manager.request({}, 'parquet') != first
+    wait_for(manager, first)
+    engine.version = 'v2'
+    assert manager.request({}, 'csv') != first
+
+
+def test_unknown_format_is_rejected(manager):
+    with pytest.raises(ValueError):
+        manager.request({}, 'pdf')
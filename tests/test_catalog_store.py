@@ -0,0 +1,141 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import catalog_store
+from catalog_ingest import load_catalog
+from catalog_store import CatalogStore, _row_keys
+
+COLUMNS = ['SERVER', 'DB', 'SCHEMA', 'DATA MART', 'PATH', 'REPORT NAME']
+ROW_KEY = ['PATH', 'REPORT NAME']
+
+BASE = [
+    ['srv1', 'AAD', 'dbo', 'sales', '/a', 'Orders'],
+    ['srv1', 'AAD', 'dbo', 'sales', '/a', 'Returns'],
+    ['srv2', 'ARCH', 'mer', 'stock', '/b', 'Levels'],
+    ['srv2', 'ARCH', 'mer', 'stock', '/b', 'Levels'],
+    ['srv3', 'WSS_DM', 'dbo', 'hr', '/c', 'Headcount'],
+    ['srv3', 'WSS_DM', 'dbo', 'hr', '/c', 'Leavers'],
+]
+
+
+def write(path, rows):
+    pd.DataFrame(rows, columns=COLUMNS).to_csv(path, index=False)
+
+
+def live_rows(store):
+    # Live rows in the store's canonical order, as plain values
+    return store.df.iloc[store.order].astype(str).reset_index(drop=True)
+
+
+def assert_matches_fresh_load(store, path):
+    fresh = CatalogStore(load_catalog, str(path), row_key=ROW_KEY)
+    assert store.fingerprint == fresh.fingerprint
+    assert store.rows == fresh.rows
+    pd.testing.assert_frame_equal(live_rows(store), live_rows(fresh))
+    assert store.counts == fresh.counts
+
+
+@pytest.fixture
+def export(tmp_path):
+    path = tmp_path / 'export.csv'
+    write(path, BASE)
+    return path
+
+
+def test_row_keys_tell_duplicates_apart():
+    df = pd.DataFrame(BASE, columns=COLUMNS)
+    keys = _row_keys(df)
+    assert len(set(keys)) == len(df)
+    # Same rows in another order: same multiset of keys
+    assert sorted(_row_keys(df.iloc[::-1].reset_index(drop=True))) == sorted(keys)
+
+
+def test_row_keys_change_with_content():
+    df = pd.DataFrame(BASE, columns=COLUMNS)
+    edited = df.copy()
+    edited.loc[0, 'DB'] = 'ARCH'
+    assert _row_keys(df)[0] != _row_keys(edited)[0]
+    assert list(_row_keys(df)[1:]) == list(_row_keys(edited)[1:])
+
+
+def test_refresh_without_changes(export):
+    store = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    fingerprint = store.fingerprint
+    summary = store.refresh()
+    assert (summary.version, summary.rows_added, summary.rows_removed, summary.rows_changed) == (1, 0, 0, 0)
+    assert store.fingerprint == fingerprint
+
+
+def test_refresh_reports_edits_additions_and_deletions(export):
+    store = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    deltas = []
+    store.subscribe(lambda store, delta: deltas.append(delta))
+    rows = [row[:] for row in BASE]
+    rows[0][1] = 'ARCH'                                     # edit
+    del rows[5]                                             # deletion
+    rows.append(['srv4', 'AAD', 'dbo', 'ops', '/d', 'Uptime'])  # addition
+    write(export, rows)
+
+    summary = store.refresh()
+    assert (summary.version, summary.rows_added, summary.rows_removed, summary.rows_changed) == (2, 1, 1, 1)
+    assert summary.rows_total == len(rows)
+    assert len(deltas) == 1 and not deltas[0].compacted
+    assert deltas[0].touches({'SERVER': 'srv4'})
+    assert not deltas[0].touches({'SERVER': 'srv2'})
+    assert_matches_fresh_load(store, export)
+
+
+def test_refresh_handles_duplicate_rows(export):
+    store = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    # One copy of the duplicated row goes, another row is duplicated
+    write(export, BASE[:3] + BASE[4:] + [BASE[0]])
+    summary = store.refresh()
+    assert (summary.rows_added, summary.rows_removed, summary.rows_changed) == (1, 1, 0)
+    assert_matches_fresh_load(store, export)
+
+
+def test_refresh_compacts_sparse_frames(export, monkeypatch):
+    monkeypatch.setattr(catalog_store, 'COMPACT_RATIO', 0.25)
+    store = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    deltas = []
+    store.subscribe(lambda store, delta: deltas.append(delta))
+    write(export, BASE[:2])
+    store.refresh()
+    assert deltas[-1].compacted
+    assert len(store.df) == store.rows == 2
+    assert_matches_fresh_load(store, export)
+
+
+def test_refresh_after_header_change_reloads(export):
+    store = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    fingerprint = store.fingerprint
+    frame = pd.DataFrame(BASE, columns=COLUMNS).rename(columns={'PATH': 'Path'})
+    frame.to_csv(export, index=False)
+    summary = store.refresh()
+    assert summary.version == 2
+    assert 'Path' in store.df.columns
+    assert store.fingerprint != fingerprint
+
+
+def test_fingerprint_ignores_row_order(export, tmp_path):
+    shuffled = tmp_path / 'shuffled.csv'
+    write(shuffled, BASE[::-1])
+    first = CatalogStore(load_catalog, str(export), row_key=ROW_KEY)
+    second = CatalogStore(load_catalog, str(shuffled), row_key=ROW_KEY)
+    assert first.fingerprint == second.fingerprint
+    pd.testing.assert_frame_equal(live_rows(first), live_rows(second))
+
+
+def test_refresh_from_a_frame_loader(export):
+    # Loaders that do not read the CSV record by record fall back to a
+    # reload and a diff of the parsed rows
+    def loader(path):
+        return pd.read_csv(path, dtype=str).astype({'SERVER': 'category'})
+
+    store = CatalogStore(loader, str(export), row_key=ROW_KEY)
+    write(export, BASE[1:])
+    summary = store.refresh()
+    assert (summary.rows_added, summary.rows_removed, summary.rows_total) == (0, 1, 5)
+    assert np.array_equal(np.sort(store.df.iloc[store.order]['REPORT NAME'].to_numpy()),
+                          np.sort(loader(str(export))['REPORT NAME'].to_numpy()))
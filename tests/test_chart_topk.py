@@ -0,0 +1,32 @@
+import pandas as pd
+
+from chart_topk import OTHER_LABEL, top_k_frame
+
+
+def counts():
+    return pd.Series({'srv1': 9, 'srv2': 7, 'srv3': 4, 'srv4': 2, 'srv5': 1, 'srv6': 0})
+
+
+def test_top_k_rolls_the_rest_into_other():
+    frame = top_k_frame(counts(), 'SERVER', k=3)
+    assert list(frame['SERVER']) == ['srv1', 'srv2', 'srv3', f"{OTHER_LABEL} (2 more)"]
+    assert list(frame['Count']) == [9, 7, 4, 3]
+    assert list(frame['kind']) == ['value', 'value', 'value', 'other']
+
+
+def test_top_k_without_a_remainder_has_no_other_row():
+    frame = top_k_frame(counts(), 'SERVER', k=10)
+    # Zero counts are not drawn
+    assert list(frame['SERVER']) == ['srv1', 'srv2', 'srv3', 'srv4', 'srv5']
+    assert set(frame['kind']) == {'value'}
+
+
+def test_top_k_offset_pages_through_the_ranks():
+    frame = top_k_frame(counts(), 'SERVER', k=2, offset=2)
+    assert list(frame['SERVER']) == ['srv3', 'srv4', f"{OTHER_LABEL} (1 more)"]
+    assert list(frame['Count']) == [4, 2, 1]
+
+
+def test_top_k_of_empty_counts():
+    frame = top_k_frame(pd.Series(dtype='int64'), 'SERVER', k=3)
+    assert frame.empty
@@ -0,0 +1,32 @@
+import option_index
+from option_index import _Entry
+
+COUNTS = {'ARCH': 5, 'AAD': 12, 'aw_wsl_01': 3, 'WSS_DM': 8, 'WSS_APTOS': 1, 'me_wsl_01': 2}
+
+
+def test_empty_query_ranks_by_count():
+    assert _Entry(COUNTS).search('', 3) == ['AAD', 'WSS_DM', 'ARCH']
+
+
+def test_prefix_matches_ignore_case_and_rank_by_count():
+    assert _Entry(COUNTS).search('a', 3) == ['AAD', 'ARCH', 'aw_wsl_01']
+    assert _Entry(COUNTS).search('wss_', 10) == ['WSS_DM', 'WSS_APTOS']
+
+
+def test_limit_keeps_the_most_reported_matches():
+    assert _Entry(COUNTS).search('a', 2) == ['AAD', 'ARCH']
+
+
+def test_substring_matches_fill_up_after_prefix_matches():
+    assert _Entry(COUNTS).search('a', 10) == ['AAD', 'ARCH', 'aw_wsl_01', 'WSS_APTOS']
+    assert _Entry(COUNTS).search('wsl', 10) == ['aw_wsl_01', 'me_wsl_01']
+    assert _Entry(COUNTS).search('_d', 10) == ['WSS_DM']
+
+
+def test_substring_fallback_can_be_turned_off(monkeypatch):
+    monkeypatch.setattr(option_index, 'SUBSTRING_SCAN', 0)
+    assert _Entry(COUNTS).search('wsl', 10) == []
+
+
+def test_no_match():
+    assert _Entry(COUNTS).search('zzz', 10) == []
@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+from shared_cache import SqliteCache, TieredCache
+
+
+class Version:
+    # Stand-in for a store's fingerprint
+    def __init__(self, value='v1'):
+        self.value = value
+
+    def __call__(self):
+        return self.value
+
+
+class Delta:
+    # Refresh delta touching the filters on one server
+    def __init__(self, server, compacted=False):
+        self.server = server
+        self.compacted = compacted
+
+    def touches(self, filters):
+        return filters.get('SERVER') in (None, self.server)
+
+
+def counter():
+    calls = []
+
+    def compute(value):
+        def run():
+            calls.append(value)
+            return value
+        return run
+    return calls, compute
+
+
+@pytest.fixture
+def shared(tmp_path):
+    return SqliteCache(str(tmp_path / 'cache.sqlite'))
+
+
+def test_local_hits_skip_compute():
+    cache = TieredCache(Version())
+    calls, compute = counter()
+    assert cache.get_or_compute('counts', {'SERVER': 'a'}, compute(1)) == 1
+    assert cache.get_or_compute('counts', {'SERVER': 'a'}, compute(2)) == 1
+    assert calls == [1]
+    assert cache.hits == {'local': 1, 'shared': 0, 'miss': 1}
+
+
+def test_params_are_part_of_the_key():
+    cache = TieredCache(Version())
+    cache.get_or_compute('window', {}, lambda: 'first', params={'offset': 0})
+    assert cache.get_or_compute('window', {}, lambda: 'second', params={'offset': 50}) == 'second'
+
+
+def test_local_tier_evicts_least_recently_used():
+    cache = TieredCache(Version(), local_size=2)
+    cache.get_or_compute('counts', {'SERVER': 'a'}, lambda: 'a')
+    cache.get_or_compute('counts', {'SERVER': 'b'}, lambda: 'b')
+    cache.get_or_compute('counts', {'SERVER': 'a'}, lambda: 'a')
+    cache.get_or_compute('counts', {'SERVER': 'c'}, lambda: 'c')
+    assert cache.peek('counts', {'SERVER': 'a'}) == 'a'
+    assert cache.peek('counts', {'SERVER': 'b'}) is None
+    assert cache.peek('counts', {'SERVER': 'c'}) == 'c'
+
+
+def test_local_tier_evicts_by_size_but_keeps_the_newest_entry():
+    cache = TieredCache(Version(), local_bytes=1000)
+    cache.get_or_compute('rows', {'SERVER': 'a'}, lambda: np.zeros(100))
+    cache.get_or_compute('rows', {'SERVER': 'b'}, lambda: np.zeros(200))
+    assert cache.peek('rows', {'SERVER': 'a'}) is None
+    assert cache.peek('rows', {'SERVER': 'b'}) is not None
+
+
+def test_a_new_version_misses():
+    version = Version()
+    cache = TieredCache(version)
+    cache.get_or_compute('counts', {}, lambda: 'old')
+    version.value = 'v2'
+    assert cache.get_or_compute('counts', {}, lambda: 'new') == 'new'
+
+
+def test_shared_tier_serves_other_workers(shared):
+    first, second = TieredCache(Version(), shared), TieredCache(Version(), shared)
+    first.get_or_compute('counts', {'SERVER': 'a'}, lambda: {'a': 3})
+    assert second.get_or_compute('counts', {'SERVER': 'a'}, lambda: {'a': 0}) == {'a': 3}
+    assert second.hits['shared'] == 1
+
+
+def test_local_only_entries_stay_out_of_the_shared_tier(shared):
+    first, second = TieredCache(Version(), shared), TieredCache(Version(), shared)
+    first.get_or_compute('row_ids', {}, lambda: 'first', shared=False)
+    assert second.get_or_compute('row_ids', {}, lambda: 'second', shared=False) == 'second'
+
+
+def test_refresh_carries_untouched_entries_over(shared):
+    version = Version()
+    cache = TieredCache(version, shared, positional=('row_ids',))
+    for server in ('a', 'b'):
+        cache.get_or_compute('counts', {'SERVER': server}, lambda server=server: server)
+        cache.get_or_compute('row_ids', {'SERVER': server}, lambda server=server: server, shared=False)
+    version.value = 'v2'
+    cache.on_refresh(None, Delta('a'))
+
+    calls, compute = counter()
+    assert cache.get_or_compute('counts', {'SERVER': 'b'}, compute('b2')) == 'b'
+    assert cache.get_or_compute('row_ids', {'SERVER': 'b'}, compute('b2'), shared=False) == 'b'
+    assert cache.get_or_compute('counts', {'SERVER': 'a'}, compute('a2')) == 'a2'
+    assert calls == ['a2']
+
+    # Another worker reaching v2 finds the carried entry in the shared tier
+    other = TieredCache(Version('v2'), shared)
+    assert other.get_or_compute('counts', {'SERVER': 'b'}, compute('b3')) == 'b'
+    # and the previous version is still there for workers that lag behind
+    lagging = TieredCache(Version('v1'), shared)
+    assert lagging.get_or_compute('counts', {'SERVER': 'a'}, compute('a3')) == 'a'
+
+
+def test_compaction_drops_positional_entries():
+    version = Version()
+    cache = TieredCache(version, positional=('row_ids',))
+    cache.get_or_compute('row_ids', {'SERVER': 'b'}, lambda: 'b', shared=False)
+    cache.get_or_compute('counts', {'SERVER': 'b'}, lambda: 'b')
+    version.value = 'v2'
+    cache.on_refresh(None, Delta('a', compacted=True))
+    assert cache.peek('row_ids', {'SERVER': 'b'}) is None
+    assert cache.peek('counts', {'SERVER': 'b'}) == 'b'